@@ -0,0 +1 @@
+../solutions/config_batch.py
\ No newline at end of file
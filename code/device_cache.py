@@ -0,0 +1 @@
+../solutions/device_cache.py
\ No newline at end of file
@@ -0,0 +1 @@
+../solutions/instrumentation.py
\ No newline at end of file
@@ -0,0 +1 @@
+../solutions/section_config.py
\ No newline at end of file
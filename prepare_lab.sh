@@ -120,6 +120,15 @@ generate_ssh_config()
   echo "Host *.${DNS_DOMAIN}" > ${SSH_CONFIG_FILE}
   echo "  ProxyCommand openssl s_client -quiet -servername %h -connect ${PROXY_DNS_NAME}:${PROXY_SSH_PORT}" >> ${SSH_CONFIG_FILE}
   echo "  StrictHostKeyChecking no" >> ${SSH_CONFIG_FILE}
+  # Opt-in (SSH_MULTIPLEX=1): keep the authenticated SSH session open
+  # between pyATS runs so later connections are multiplexed over it instead
+  # of logging in again (see solutions/ssh_broker.py). Off by default until
+  # it has been checked against the lab routers' SSH server.
+  if [ "x${SSH_MULTIPLEX}" = "x1" ]; then
+    echo "  ControlMaster auto" >> ${SSH_CONFIG_FILE}
+    echo "  ControlPath /tmp/devwks-ssh-%C" >> ${SSH_CONFIG_FILE}
+    echo "  ControlPersist ${SSH_CONTROL_PERSIST:-30m}" >> ${SSH_CONFIG_FILE}
+  fi
   if [ -f ${SSH_CONFIG_FILE} ]; then
     echo "OK"
   else
@@ -0,0 +1,608 @@
+"""
+Benchmark the trigger pipeline against local stand-in devices
+
+Developed for Cisco Live, DevNet Workshop DEVWKS-2539
+
+Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+Runs TestOspfConfigState, TestOspfOpState and ConfigureSpokeOspf against
+BenchDevice objects. A BenchDevice is a Genie device whose CLI is replaced
+by generated IOS XE output with a configurable per-command latency, so the
+real Genie parsers and APIs run on every command.
+
+Time is split into exclusive phases:
+    connect  - simulated session setup
+    fetch    - device round trips (latency + transfer)
+    parse    - Genie parsing, excluding the round trip
+    log      - formatting of trigger log messages
+    assert   - everything else inside the trigger sections
+
+Example:
+    python benchmark.py --devices 1,10,50 --config-lines 1000,100000 \\
+        --routes 10,100000 --latency 0.05 --output bench.json
+"""
+
+__author__ = "Palmer Sample"
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import argparse
+import contextlib
+import inspect
+import ipaddress
+import itertools
+import json
+import logging
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from genie.conf.base import Device
+
+from config_state_test import TestOspfConfigState
+from configure_spoke_routing import ConfigureSpokeOspf
+from device_cache import CACHE, PARSE_CACHE
+from op_state_test import TestOspfOpState
+from ospf_interface import PARSERS
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+PHASES = ("connect", "fetch", "parse", "log", "assert")
+
+TRIGGERS = (TestOspfConfigState, TestOspfOpState, ConfigureSpokeOspf)
+
+# Trigger parameters, as they would come from the trigger datafile
+PARAMETERS = {
+    "ospf_process_id": 4,
+    "ospf_router_id": "0.0.0.2",
+    "tunnel_interface": "Tunnel1",
+    "tunnel_ospf_area": "0.0.0.0",
+    "tunnel_interface_enabled": True,
+    "hub_loopback_ip": "172.16.1.254/32",
+}
+
+SHOW_IP_OSPF = """\
+ Routing Process "ospf {pid}" with ID {router_id}
+ Start time: 00:00:01.234, Time elapsed: 1d02h
+ Supports only single TOS(TOS0) routes
+ Supports opaque LSA
+ Supports Link-local Signaling (LLS)
+ Supports area transit capability
+ Supports NSSA (compatible with RFC 3101)
+ Event-log enabled, Maximum number of events: 1000, Mode: cyclic
+ Router is not originating router-LSAs with maximum metric
+ Initial SPF schedule delay 5000 msecs
+ Minimum hold time between two consecutive SPFs 10000 msecs
+ Maximum wait time between two consecutive SPFs 10000 msecs
+ Incremental-SPF disabled
+ Minimum LSA interval 5 secs
+ Minimum LSA arrival 1000 msecs
+ LSA group pacing timer 240 secs
+ Interface flood pacing timer 33 msecs
+ Retransmission pacing timer 66 msecs
+ Number of external LSA 0. Checksum Sum 0x000000
+ Number of opaque AS LSA 0. Checksum Sum 0x000000
+ Number of DCbitless external and opaque AS LSA 0
+ Number of DoNotAge external and opaque AS LSA 0
+ Number of areas in this router is 1. 1 normal 0 stub 0 nssa
+ Number of areas transit capable is 0
+ External flood list length 0
+ IETF NSF helper support enabled
+ Cisco NSF helper support enabled
+ Reference bandwidth unit is 100 mbps
+    Area BACKBONE(0)
+        Number of interfaces in this area is 1
+        Area has no authentication
+        SPF algorithm last executed 00:01:00.000 ago
+        SPF algorithm executed 3 times
+        Area ranges are
+        Number of LSA 3. Checksum Sum 0x01C0D4
+        Number of opaque link LSA 0. Checksum Sum 0x000000
+        Number of DCbitless LSA 0
+        Number of indication LSA 0
+        Number of DoNotAge LSA 0
+        Flood list length 0
+"""
+
+SHOW_IP_PROTOCOLS = """\
+*** IP Routing is NSF aware ***
+
+Routing Protocol is "application"
+  Sending updates every 0 seconds
+  Invalid after 0 seconds, hold down 0, flushed after 0
+  Outgoing update filter list for all interfaces is not set
+  Incoming update filter list for all interfaces is not set
+  Maximum path: 32
+  Routing for Networks:
+  Routing Information Sources:
+    Gateway         Distance      Last Update
+  Distance: (default is 4)
+
+Routing Protocol is "ospf {pid}"
+  Outgoing update filter list for all interfaces is not set
+  Incoming update filter list for all interfaces is not set
+  Router ID {router_id}
+  Number of areas in this router is 1. 1 normal 0 stub 0 nssa
+  Maximum path: 4
+  Routing for Networks:
+  Routing on Interfaces Configured Explicitly (Area 0):
+    {interface}
+  Passive Interface(s):
+    Loopback0
+  Routing Information Sources:
+    Gateway         Distance      Last Update
+    172.16.1.254         110      00:10:00
+  Distance: (default is 110)
+
+"""
+
+SHOW_IP_OSPF_INTERFACE = """\
+{interface} is up, line protocol is up
+  Internet Address 10.255.0.2/24, Interface ID 13, Area 0
+  Attached via Interface Enable
+  Process ID {pid}, Router ID {router_id}, Network Type POINT_TO_POINT, Cost: 1000
+  Topology-MTID    Cost    Disabled    Shutdown      Topology Name
+        0           1000      no          no            Base
+  Enabled by interface config, including secondary ip addresses
+  Transmit Delay is 1 sec, State POINT_TO_POINT
+  Timer intervals configured, Hello 10, Dead 40, Wait 40, Retransmit 5
+    oob-resync timeout 40
+    Hello due in 00:00:05
+  Supports Link-local Signaling (LLS)
+  Cisco NSF helper support enabled
+  IETF NSF helper support enabled
+  Index 1/1/1, flood queue length 0
+  Next 0x0(0)/0x0(0)/0x0(0)
+  Last flood scan length is 1, maximum is 1
+  Last flood scan time is 0 msec, maximum is 0 msec
+  Neighbor Count is 1, Adjacent neighbor count is 1
+    Adjacent with neighbor 172.16.1.254
+  Suppress hello for 0 neighbor(s)
+"""
+
+SHOW_IP_ROUTE_HEADER = """\
+Codes: L - local, C - connected, S - static, R - RIP, M - mobile, B - BGP
+       D - EIGRP, EX - EIGRP external, O - OSPF, IA - OSPF inter area
+       N1 - OSPF NSSA external type 1, N2 - OSPF NSSA external type 2
+       E1 - OSPF external type 1, E2 - OSPF external type 2
+
+Gateway of last resort is not set
+
+"""
+
+SHOW_IP_ROUTE_ENTRY = """\
+Routing entry for {prefix}
+  Known via "ospf {pid}", distance 110, metric 1001, type intra area
+  Last update from 10.255.0.1 on Tunnel1, 00:10:00 ago
+  Routing Descriptor Blocks:
+  * 10.255.0.1, from 172.16.1.254, 00:10:00 ago, via Tunnel1
+      Route metric is 1001, traffic share count is 1
+"""
+
+
+class PhaseTimer:
+    """
+    Accumulates exclusive time per phase. Nested phases pause the enclosing
+    one, so every second is attributed to exactly one phase.
+    """
+    def __init__(self):
+        self.totals = dict.fromkeys(PHASES, 0.0)
+        self._stack = []
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Attribute the time spent in the block to a phase.
+
+        :param name: Phase name
+        """
+        now = time.perf_counter()
+        if self._stack:
+            outer, started = self._stack[-1]
+            self.totals[outer] += now - started
+        self._stack.append((name, now))
+        try:
+            yield
+        finally:
+            name, started = self._stack.pop()
+            now = time.perf_counter()
+            self.totals[name] += now - started
+            if self._stack:
+                self._stack[-1] = (self._stack[-1][0], now)
+
+
+# Timer of the device being benchmarked by the current thread
+_CURRENT = threading.local()
+
+
+class TimedLogHandler(logging.Handler):
+    """
+    Formats every trigger log record, attributing the cost to the "log"
+    phase of the current device.
+    """
+    def emit(self, record):
+        timer = getattr(_CURRENT, "timer", None)
+        if timer is None:
+            self.format(record)
+            return
+        with timer.phase("log"):
+            self.format(record)
+
+
+def synthetic_running_config(config_lines, pid, router_id, interface):
+    """
+    Generate a running-config of roughly config_lines lines containing the
+    sections the triggers read.
+
+    :return: list of configuration lines
+    """
+    config = [
+        f"interface {interface}",
+        " ip address 10.255.0.2 255.255.255.0",
+        f" ip ospf {pid} area 0.0.0.0",
+        " no shutdown",
+        f"router ospf {pid}",
+        f" router-id {router_id}",
+        " passive-interface default",
+        f" no passive-interface {interface}",
+    ]
+    for index in itertools.count():
+        if len(config) >= config_lines:
+            break
+        address = ipaddress.IPv4Address("100.64.0.0") + index
+        config += [f"interface Loopback{index + 100}",
+                   f" description filler interface {index}",
+                   f" ip address {address} 255.255.255.255"]
+    return config
+
+
+def section_filter(config, pattern):
+    """
+    Emulate "show running-config | section <pattern>".
+
+    :param config: list of configuration lines
+    :param pattern: Section filter regular expression
+    :return: Filtered output
+    """
+    regex = re.compile(pattern)
+    output = []
+    in_section = False
+    for line in config:
+        if not line.startswith(" "):
+            in_section = bool(regex.search(line))
+        if in_section:
+            output.append(line)
+    return "\n".join(output)
+
+
+class BenchConnection:
+    """
+    Stand-in for the unicon "cli" connection. Genie's Device.parse() and
+    the APIs send commands through device.cli when the device reports
+    itself connected; they are served by the BenchDevice.
+    """
+    def __init__(self, device):
+        self.device = device
+
+    def execute(self, command, *args, **kwargs):
+        return self.device.execute(command, *args, **kwargs)
+
+    def configure(self, config, *args, **kwargs):
+        return self.device.configure(config, *args, **kwargs)
+
+    def is_connected(self):  # pylint: disable=no-self-use
+        return True
+
+
+class BenchDevice(Device):
+    """
+    Genie device whose CLI is served from generated output, with a fixed
+    latency per round trip and a transfer cost per byte.
+    """
+    def __init__(self, name, timer, latency=0.05, bandwidth=1_000_000,
+                 config_lines=1000, routes=10, **kwargs):
+        super().__init__(name, os="iosxe", **kwargs)
+        self.custom = {"abstraction": {"order": ["os"]}}
+        self.timer = timer
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.commands = 0
+        self.bytes_received = 0
+        self.running_config = synthetic_running_config(config_lines,
+                                                       PARAMETERS["ospf_process_id"],
+                                                       PARAMETERS["ospf_router_id"],
+                                                       PARAMETERS["tunnel_interface"])
+        self.cli = BenchConnection(self)
+        self.routes = [PARAMETERS["hub_loopback_ip"]] + [
+            f"{ipaddress.IPv4Address('10.128.0.0') + index}/32"
+            for index in range(max(routes - 1, 0))
+        ]
+
+    def is_connected(self, *args, **kwargs):  # pylint: disable=unused-argument
+        return True
+
+    def connect(self, *args, **kwargs):  # pylint: disable=unused-argument
+        with self.timer.phase("connect"):
+            time.sleep(self.latency * 4)
+
+    def _output(self, command):
+        pid = PARAMETERS["ospf_process_id"]
+        router_id = PARAMETERS["ospf_router_id"]
+        if command == "show running-config":
+            return "\n".join(self.running_config)
+        if command.startswith("show running-config | section "):
+            return section_filter(self.running_config,
+                                  command.split("section ", 1)[1])
+        if command == "show ip ospf":
+            return SHOW_IP_OSPF.format(pid=pid, router_id=router_id)
+        if command == "show ip protocols":
+            return SHOW_IP_PROTOCOLS.format(pid=pid,
+                                            router_id=router_id,
+                                            interface=PARAMETERS["tunnel_interface"])
+        if command.startswith("show ip ospf interface"):
+            return SHOW_IP_OSPF_INTERFACE.format(interface=PARAMETERS["tunnel_interface"],
+                                                 pid=pid,
+                                                 router_id=router_id)
+        if command == "show ip route ospf":
+            return SHOW_IP_ROUTE_HEADER + "\n".join(
+                f"O        {prefix} [110/1001] via 10.255.0.1, 00:10:00, Tunnel1"
+                for prefix in self.routes)
+        if command.startswith("show ip route "):
+            # "show ip route <address> [<netmask>]"
+            prefix = str(ipaddress.IPv4Network("/".join(command.split()[3:5]),
+                                               strict=False))
+            if prefix in self.routes:
+                return SHOW_IP_ROUTE_ENTRY.format(prefix=prefix, pid=pid)
+            return "% Network not in table"
+        return ""
+
+    def execute(self, command, *args, **kwargs):  # pylint: disable=unused-argument
+        with self.timer.phase("fetch"):
+            output = self._output(command)
+            self.commands += 1
+            self.bytes_received += len(output)
+            time.sleep(self.latency + len(output) / self.bandwidth)
+        return output
+
+    def configure(self, config, *args, **kwargs):  # pylint: disable=unused-argument
+        with self.timer.phase("fetch"):
+            self.commands += 1
+            time.sleep(self.latency)
+        return ""
+
+    def parse(self, *args, **kwargs):
+        with self.timer.phase("parse"):
+            return super().parse(*args, **kwargs)
+
+
+class SectionResult(Exception):
+    """
+    Raised by the SectionStub result methods to end a section, as aetest
+    does with its result signals.
+    """
+    def __init__(self, result, reason=None):
+        super().__init__(reason)
+        self.result = result
+
+
+class SectionStub:
+    """
+    Minimal stand-in for the aetest section object passed as "self".
+    """
+    def __init__(self, uid, parameters):
+        self.uid = uid
+        self.parameters = parameters
+
+    def passed(self, reason=None):
+        """aetest-compatible result API"""
+        raise SectionResult("passed", reason)
+
+    def failed(self, reason=None):
+        """aetest-compatible result API"""
+        raise SectionResult("failed", reason)
+
+    def skipped(self, reason=None):
+        """aetest-compatible result API"""
+        raise SectionResult("skipped", reason)
+
+
+class StepsStub:
+    """
+    Minimal stand-in for the aetest "steps" object.
+    """
+    @contextlib.contextmanager
+    def start(self, *args, **kwargs):  # pylint: disable=unused-argument
+        """aetest-compatible step API"""
+        yield self
+
+
+def trigger_sections(trigger_class):
+    """
+    Return the aetest sections of a trigger class in definition order.
+
+    :param trigger_class: Trigger class
+    :return: list of functions
+    """
+    return [function for function in vars(trigger_class).values()
+            if callable(function) and hasattr(function, "__testcls__")]
+
+
+def run_trigger(trigger_class, device, parameters):
+    """
+    Run every section of a trigger against a device, resolving section
+    arguments from the parameters like aetest does.
+
+    :param trigger_class: Trigger class
+    :param device: BenchDevice
+    :param parameters: Trigger parameters (updated by the sections)
+    :return: dict of section name -> result
+    """
+    section = SectionStub(trigger_class.__name__, parameters)
+    results = {}
+    for function in trigger_sections(trigger_class):
+        arguments = {"uut": device, "steps": StepsStub(), **parameters}
+        signature = inspect.signature(function)
+        kwargs = {name: arguments[name] for name in signature.parameters
+                  if name != "self" and name in arguments}
+        with device.timer.phase("assert"):
+            try:
+                function(section, **kwargs)
+                results[function.__name__] = "passed"
+            except SectionResult as result:
+                results[function.__name__] = result.result
+            except AssertionError:
+                results[function.__name__] = "failed"
+    return results
+
+
+def run_device(name, **device_options):
+    """
+    Connect to one stand-in device and run every trigger against it.
+
+    :param name: Device name
+    :param device_options: Keyword arguments for BenchDevice
+    :return: dict of per-device measurements
+    """
+    timer = PhaseTimer()
+    _CURRENT.timer = timer
+    device = BenchDevice(name, timer, **device_options)
+    device.connect()
+
+    results = {}
+    for trigger_class in TRIGGERS:
+        results[trigger_class.__name__] = run_trigger(trigger_class, device,
+                                                      dict(PARAMETERS))
+
+    _CURRENT.timer = None
+    return {
+        "device": name,
+        "commands": device.commands,
+        "bytes_received": device.bytes_received,
+        "phases": {phase: round(value, 6) for phase, value in timer.totals.items()},
+        "results": results,
+    }
+
+
+def run_scenario(devices, config_lines, routes, latency):
+    """
+    Benchmark one combination of device count, config size and RIB size.
+
+    :return: dict of scenario measurements
+    """
+    CACHE.clear()
+    PARSE_CACHE.clear()
+    tracemalloc.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=devices) as executor:
+        device_results = list(executor.map(
+            lambda index: run_device(f"bench-{index}",
+                                     latency=latency,
+                                     config_lines=config_lines,
+                                     routes=routes),
+            range(devices)))
+    wall_time = time.perf_counter() - start
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    phases = {phase: sum(result["phases"][phase] for result in device_results)
+              for phase in PHASES}
+    failures = [f"{result['device']}:{trigger}.{section}"
+                for result in device_results
+                for trigger, sections in result["results"].items()
+                for section, outcome in sections.items()
+                if outcome == "failed"]
+    return {
+        "devices": devices,
+        "config_lines": config_lines,
+        "routes": routes,
+        "latency": latency,
+        "wall_time": round(wall_time, 6),
+        "peak_memory_bytes": peak_memory,
+        "phases_total": {phase: round(value, 6) for phase, value in phases.items()},
+        "phases_per_device": {phase: round(value / devices, 6)
+                              for phase, value in phases.items()},
+        "commands_per_device": device_results[0]["commands"],
+        "cache": CACHE.stats(),
+        "failures": failures,
+    }
+
+
+def int_list(value):
+    """
+    argparse type for comma-separated integers
+    """
+    return [int(item) for item in value.split(",") if item]
+
+
+def main():
+    """
+    Command line entry point
+
+    :return: Process exit code
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--devices", type=int_list, default=[1],
+                        help="Device counts, e.g. 1,10,100")
+    parser.add_argument("--config-lines", type=int_list, default=[1000],
+                        help="Running-config sizes, e.g. 1000,100000")
+    parser.add_argument("--routes", type=int_list, default=[10],
+                        help="OSPF RIB sizes, e.g. 10,100000")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="Per-command latency in seconds")
+    parser.add_argument("--ospf-interface-parser", choices=PARSERS, default="genie",
+                        help="Parser for show ip ospf interface (see ospf_interface.py)")
+    parser.add_argument("--output", default="benchmark_report.json",
+                        help="JSON report file")
+    args = parser.parse_args()
+
+    PARAMETERS["ospf_interface_parser"] = args.ospf_interface_parser
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    # Trigger log output is formatted (to measure its cost) but not printed
+    handler = TimedLogHandler()
+    for trigger_module in ("config_state_test", "op_state_test",
+                           "configure_spoke_routing"):
+        trigger_logger = logging.getLogger(trigger_module)
+        trigger_logger.addHandler(handler)
+        trigger_logger.propagate = False
+
+    scenarios = []
+    for devices, config_lines, routes in itertools.product(args.devices,
+                                                           args.config_lines,
+                                                           args.routes):
+        scenario = run_scenario(devices, config_lines, routes, args.latency)
+        logger.info("devices=%-5d config_lines=%-7d routes=%-7d wall=%.3fs "
+                    "peak_mem=%.1fMiB %s",
+                    devices, config_lines, routes,
+                    scenario["wall_time"],
+                    scenario["peak_memory_bytes"] / 2 ** 20,
+                    " ".join(f"{phase}={value:.3f}s" for phase, value
+                             in scenario["phases_per_device"].items()))
+        scenarios.append(scenario)
+
+    with open(args.output, "w", encoding="utf-8") as report_file:
+        json.dump({"scenarios": scenarios}, report_file, indent=2)
+    logger.info("Report written to %s", args.output)
+
+    return 1 if any(scenario["failures"] for scenario in scenarios) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
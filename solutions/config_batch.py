@@ -0,0 +1,228 @@
+"""
+Batched, single-session configuration push with rollback
+
+Developed for Cisco Live, DevNet Workshop DEVWKS-2539
+
+Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+__author__ = "Palmer Sample"
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import logging
+from collections import namedtuple
+
+from unicon.core.errors import SubCommandFailure
+from unicon.eal.dialogs import Dialog, Statement
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Location of the running-config checkpoint used for rollback
+DEFAULT_CHECKPOINT = "flash:pyats-rollback.cfg"
+
+# A named change: the config section it belongs to (e.g. "router ospf 4")
+# and the lines to apply within that section.
+ConfigChange = namedtuple("ConfigChange", ["name", "section", "lines"])
+
+# Answer the "Destination filename [...]?" and overwrite prompts of "copy"
+COPY_DIALOG = Dialog([
+    Statement(pattern=r"Destination filename \[.*\]\?\s*$",
+              action="sendline()",
+              loop_continue=True),
+    Statement(pattern=r"\[confirm\]\s*$",
+              action="sendline()",
+              loop_continue=True),
+])
+
+
+class ConfigBatch:
+    """
+    Collects configuration changes from individual trigger tests and sends
+    them to the device in a single config session.
+
+    Before the push, the running-config is checkpointed to the device file
+    system. If any line is rejected, the device is restored from the
+    checkpoint with "configure replace".
+
+    When created with the learned running-config, the batch only queues the
+    lines that are not already present on the device (diff-before-configure).
+    """
+    def __init__(self, checkpoint=DEFAULT_CHECKPOINT, running_config=None):
+        self.checkpoint_file = checkpoint
+        self.running_config = running_config
+        self.changes = []
+        # Expected state of each section once the queued changes are applied
+        self._target_sections = {}
+
+    def __len__(self):
+        return len(self.changes)
+
+    def add(self, name, section, *lines):
+        """
+        Queue a change for the next commit. In diff mode, lines already
+        present in the running-config are dropped and nothing is queued if
+        the device is already compliant.
+
+        :param name: Name reported for this change (e.g. the aetest test name)
+        :param section: Parent config section, or None for global config
+        :param lines: Configuration lines to apply within the section
+        :return: True if the change was queued, False if already configured
+        """
+        if self.running_config is not None:
+            lines = self.missing_lines(section, lines)
+            if not lines:
+                logger.info("'%s' is already configured, nothing to queue", name)
+                return False
+
+        self.changes.append(ConfigChange(name, section, tuple(lines)))
+        return True
+
+    def _target_section(self, section):
+        """
+        Return the set of lines expected in a section after the changes
+        queued so far, seeded from the learned running-config.
+
+        :param section: Config section name, or None for global config
+        :return: set of configuration lines
+        """
+        if section not in self._target_sections:
+            if section is None:
+                learned = self.running_config or {}
+            else:
+                learned = self.running_config.get(section, None) or {}
+            self._target_sections[section] = set(learned)
+        return self._target_sections[section]
+
+    def missing_lines(self, section, lines):
+        """
+        Compute the lines that still need to be applied to a section.
+
+        A line "X" is satisfied if present. A negated line "no X" is satisfied
+        if it is present, or if "X" is absent and the section does not carry
+        a "<command> default" line that would make "X" the implicit state
+        (e.g. "passive-interface default" for "no passive-interface Tunnel1").
+
+        :param section: Config section name, or None for global config
+        :param lines: Desired configuration lines
+        :return: list of lines that are not yet configured
+        """
+        target = self._target_section(section)
+        missing = []
+        for line in lines:
+            if line.startswith("no "):
+                positive = line[3:]
+                default = f"{positive.split()[0]} default"
+                if line in target or (positive not in target
+                                      and default not in target):
+                    continue
+                target.discard(positive)
+                if default in target:
+                    target.add(line)
+            else:
+                if line in target:
+                    continue
+                target.add(line)
+                target.discard(f"no {line}")
+            missing.append(line)
+        return missing
+
+    def render(self):
+        """
+        Render the queued changes as one block of configuration. Lines for
+        the same section are grouped under a single section header, in the
+        order the changes were queued.
+
+        :return: list of configuration lines
+        """
+        sections = {}
+        for change in self.changes:
+            sections.setdefault(change.section, []).extend(change.lines)
+
+        config = []
+        for section, lines in sections.items():
+            if section is None:
+                config.extend(lines)
+                continue
+            config.append(section)
+            config.extend(lines)
+            config.append("exit")
+        return config
+
+    def checkpoint(self, uut):
+        """
+        Save the running-config to the checkpoint file.
+
+        :param uut: Testbed device object
+        :return: None
+        """
+        uut.execute(f"copy running-config {self.checkpoint_file}",
+                    reply=COPY_DIALOG)
+
+    def rollback(self, uut):
+        """
+        Restore the running-config from the checkpoint file.
+
+        :param uut: Testbed device object
+        :return: None
+        """
+        logger.warning("Rolling back '%s' to %s", uut.name, self.checkpoint_file)
+        uut.execute(f"configure replace {self.checkpoint_file} force")
+
+    def discard_checkpoint(self, uut):
+        """
+        Remove the checkpoint file after a successful commit.
+
+        :param uut: Testbed device object
+        :return: None
+        """
+        try:
+            uut.execute(f"delete /force {self.checkpoint_file}")
+        except SubCommandFailure as err:
+            logger.warning("Unable to delete %s: %s", self.checkpoint_file, err)
+
+    def commit(self, uut):
+        """
+        Push every queued change in one config session, rolling back if any
+        line fails.
+
+        :param uut: Testbed device object
+        :raises SubCommandFailure: if the push failed (after rollback, even
+            if the rollback itself failed)
+        :return: list of configuration lines that were applied
+        """
+        config = self.render()
+        if not config:
+            logger.info("No configuration changes queued for '%s'", uut.name)
+            return config
+
+        self.checkpoint(uut)
+        logger.info("Applying %d changes to '%s' in one config session:\n%s",
+                    len(self.changes), uut.name, "\n".join(config))
+        try:
+            uut.configure(config)
+        except SubCommandFailure as push_error:
+            logger.error("Config push to '%s' failed: %s", uut.name, push_error)
+            try:
+                self.rollback(uut)
+            except Exception as rollback_error:  # pylint: disable=broad-except
+                logger.error("Rollback of '%s' to %s failed, the device may be "
+                             "partially configured: %s",
+                             uut.name, self.checkpoint_file, rollback_error)
+            raise push_error
+
+        self.discard_checkpoint(uut)
+        return config
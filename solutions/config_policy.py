@@ -0,0 +1,194 @@
+"""
+Declarative config-state policy: expected, forbidden and pattern checks
+
+Developed for Cisco Live, DevNet Workshop DEVWKS-2539
+
+Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+A policy maps config sections to the lines expected in them, the lines
+that must not be present, and regular expressions at least one line must
+match:
+
+    config_policy:
+      "router ospf {ospf_process_id}":
+        expected:
+          - "router-id {ospf_router_id}"
+        forbidden:
+          - "passive-interface default"
+      "interface {tunnel_interface}":
+        expected:
+          - "ip ospf {ospf_process_id} area {tunnel_ospf_area}"
+        patterns:
+          - "^tunnel source \\S+$"
+
+Section names and expected/forbidden lines are formatted with the trigger
+parameters. Patterns are used as-is.
+
+Each section is indexed once as a set of its lines (children at any
+depth), so expected and forbidden lines are hash lookups. All patterns of a
+section are combined into one regular expression used as a prefilter in a
+single pass over the lines; inline flags such as "(?i)" apply to their own
+pattern only. The cost grows with the size of the section, not with the
+number of rules.
+
+A policy can also be set in a fleet template (see fleet_template.yml); the
+placeholders above are left for the trigger to fill in.
+"""
+
+__author__ = "Palmer Sample"
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import logging
+import re
+from collections import namedtuple
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# A failed policy rule
+Violation = namedtuple("Violation", ["section", "kind", "rule"])
+
+# Compiled rules for one config section
+SectionPolicy = namedtuple("SectionPolicy",
+                           ["section", "expected", "forbidden", "patterns", "prefilter"])
+
+# Inline global flags at the start of a pattern, e.g. "(?i)"
+GLOBAL_FLAGS = re.compile(r"^\(\?([aiLmsux]+)\)")
+
+
+def compile_prefilter(patterns):
+    """
+    Combine patterns into one alternation matching a line if any of them
+    does. Leading inline flags such as "(?i)" are only valid at the start
+    of an expression, so each pattern's flags are scoped to its own group.
+
+    :param patterns: list of compiled patterns
+    :return: Compiled prefilter, or None if the patterns cannot be combined
+        (every pattern is then searched on its own)
+    """
+    if not patterns:
+        return None
+    groups = []
+    for pattern in patterns:
+        match = GLOBAL_FLAGS.match(pattern.pattern)
+        if match:
+            groups.append(f"(?{match.group(1)}:{pattern.pattern[match.end():]})")
+        else:
+            groups.append(f"(?:{pattern.pattern})")
+    try:
+        return re.compile("|".join(groups))
+    except re.error as err:
+        logger.debug("Patterns cannot be combined, searching them one by one: %s", err)
+        return None
+
+
+def compile_policy(policy, parameters):
+    """
+    Compile a policy from the datafile.
+
+    :param policy: dict of section -> dict of "expected", "forbidden" and
+        "patterns" lists
+    :param parameters: Trigger parameters used to format the policy
+    :return: list of SectionPolicy
+    """
+    compiled = []
+    for section, rules in (policy or {}).items():
+        rules = rules or {}
+        patterns = [re.compile(pattern) for pattern in rules.get("patterns", ())]
+        compiled.append(SectionPolicy(
+            section=section.format_map(parameters),
+            expected=tuple(str(line).format_map(parameters)
+                           for line in rules.get("expected", ())),
+            forbidden=tuple(str(line).format_map(parameters)
+                            for line in rules.get("forbidden", ())),
+            patterns=tuple(patterns),
+            prefilter=compile_prefilter(patterns),
+        ))
+    return compiled
+
+
+def policy_sections(policy, parameters):
+    """
+    Config sections read by a policy, e.g. to prefetch them.
+
+    :param policy: Policy from the datafile
+    :param parameters: Trigger parameters used to format the policy
+    :return: list of section names
+    """
+    return [section.format_map(parameters) for section in (policy or {})]
+
+
+def section_lines(tree):
+    """
+    Flatten a parsed config section into the set of its lines.
+
+    :param tree: dict of the section's children (genie Config tree)
+    :return: set of str
+    """
+    lines = set()
+    pending = [tree]
+    while pending:
+        for line, children in pending.pop().items():
+            lines.add(line.strip())
+            if children:
+                pending.append(children)
+    return lines
+
+
+def evaluate_section(section_policy, tree):
+    """
+    Evaluate one section's rules against its parsed config.
+
+    :param section_policy: SectionPolicy
+    :param tree: dict of the section's children, or None if not configured
+    :return: list of Violation
+    """
+    section = section_policy.section
+    if tree is None:
+        if section_policy.expected or section_policy.patterns:
+            return [Violation(section, "section", "not configured")]
+        return []
+
+    lines = section_lines(tree)
+    violations = [Violation(section, "expected", line)
+                  for line in section_policy.expected if line not in lines]
+    violations.extend(Violation(section, "forbidden", line)
+                      for line in section_policy.forbidden if line in lines)
+
+    pending = list(section_policy.patterns)
+    if pending:
+        for line in lines:
+            if section_policy.prefilter and not section_policy.prefilter.search(line):
+                continue
+            pending = [pattern for pattern in pending if not pattern.search(line)]
+            if not pending:
+                break
+    violations.extend(Violation(section, "pattern", pattern.pattern)
+                      for pattern in pending)
+    return violations
+
+
+def evaluate_policy(compiled, running_config):
+    """
+    Evaluate a compiled policy against the device configuration.
+
+    :param compiled: list of SectionPolicy
+    :param running_config: SectionConfig (or any object with .get(section))
+    :return: dict of section -> list of Violation
+    """
+    return {section_policy.section: evaluate_section(section_policy,
+                                                     running_config.get(section_policy.section))
+            for section_policy in compiled}
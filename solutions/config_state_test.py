@@ -24,6 +24,8 @@ __copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
 __license__ = "Cisco Sample Code License, Version 1.1"
 
 import logging
+import os
+from datetime import datetime, timezone
 
 # Import JSON for formatted output
 import json
@@ -32,6 +34,12 @@ import json
 from genie.harness.base import Trigger
 from pyats import aetest
 
+from config_policy import compile_policy, evaluate_policy, policy_sections
+from device_cache import CACHE
+from section_config import SectionConfig, ospf_sections
+from state_store import StateStore
+from verdict_store import VerdictStore, device_key, digest, last_config_change
+
 # Set up logging
 logger = logging.getLogger(__name__)
 
@@ -41,25 +49,148 @@ class TestOspfConfigState(Trigger):
     OSPF Configuration state trigger
     """
     @aetest.setup
-    def prepare_test(self, uut):
+    def prepare_test(self,
+                     uut,
+                     ospf_process_id,
+                     ospf_router_id,
+                     tunnel_interface,
+                     tunnel_ospf_area,
+                     tunnel_interface_enabled,
+                     config_policy=None,
+                     verdict_store=None,
+                     state_store=None):
         """
         Perform setup tasks for this testscript.
 
         Tasks performed:
-          - Use Genie Learn to collect the running configuration
-          - Set a parameter named "running_config" to store the learned data
+          - Work out which running-config sections the tests read from the
+            datafile parameters
+          - Set a parameter named "running_config" to a lazily populated
+            config object that retrieves only those sections (served from
+            the job-scoped device cache when already retrieved)
+          - If a state store is configured and the device configuration has
+            not changed since the sections were stored, serve them from the
+            store instead of retrieving them
+          - In incremental mode, compare the device inputs with the previous
+            run and set "reused_verdict" if they are unchanged
 
         :param uut: Testbed device object for this trigger
+        :param ospf_process_id: Trigger parameter for desired OSPF process ID
+        :param ospf_router_id: Desired router-id from the trigger datafile
+        :param tunnel_interface: Datafile parameter for the tunnel interface
+        :param tunnel_ospf_area: Datafile parameter for Tunnel OSPF area
+        :param tunnel_interface_enabled: Datafile parameter for Tunnel
+            interface state
+        :param config_policy: Declarative config policy (from datafile,
+            default None). See config_policy.py.
+        :param verdict_store: Directory of stored verdicts; enables
+            incremental mode (from datafile, default None)
+        :param state_store: State store directory (from datafile, default
+            None). See state_store.py.
         :return: None
         """
-        # Learn the device running-config and make it accessible to every test:
-        device_config = uut.learn("config")
+        # Make the relevant running-config sections accessible to every test:
+        sections = ospf_sections(ospf_process_id, tunnel_interface)
+        sections += [section for section in policy_sections(config_policy, self.parameters)
+                     if section not in sections]
+        device_config = SectionConfig(uut, sections)
         self.parameters.update(running_config=device_config)
 
+        if state_store:
+            self.serve_stored_sections(uut, device_config, StateStore(state_store))
+
+        if verdict_store:
+            self.check_previous_verdict(uut,
+                                        device_config,
+                                        VerdictStore(verdict_store),
+                                        {"ospf_process_id": ospf_process_id,
+                                         "ospf_router_id": ospf_router_id,
+                                         "tunnel_interface": tunnel_interface,
+                                         "tunnel_ospf_area": tunnel_ospf_area,
+                                         "tunnel_interface_enabled": tunnel_interface_enabled,
+                                         "config_policy": config_policy})
+
+    @staticmethod
+    def sections_digest(device_config):
+        """
+        Content hash of the config sections under test.
+
+        :param device_config: SectionConfig for this device
+        :return: Hex digest
+        """
+        return digest({section: device_config.get(section)
+                       for section in device_config.sections})
+
+    def serve_stored_sections(self, uut, device_config, store):
+        """
+        Seed the config object with the sections stored by a previous run,
+        if the device's "Last configuration change" stamp has not moved
+        since. Sections that were not stored are retrieved as usual.
+
+        :param uut: Testbed device object for this trigger
+        :param device_config: SectionConfig for this device
+        :param store: StateStore
+        :return: None
+        """
+        config_change = last_config_change(uut)
+        self.parameters.update(config_change=config_change)
+
+        device = device_key(uut)
+        if not config_change or not os.path.exists(store.path(device)):
+            return
+        with store.reader(device) as reader:
+            if reader.get(("config_change",)) != config_change:
+                return
+            stored = reader.get(("config",), {})
+
+        device_config.seed(stored)
+        logger.info("Configuration unchanged since %s, serving %d section(s) "
+                    "from the state store", config_change, len(stored))
+
+    def check_previous_verdict(self, uut, device_config, store, trigger_parameters):
+        """
+        Reuse the previous passing verdict for this device if neither the
+        trigger parameters nor the config sections under test have changed.
+
+        The "Last configuration change" stamp is checked first; only if it
+        moved are the sections retrieved and hashed.
+
+        :param uut: Testbed device object for this trigger
+        :param device_config: SectionConfig for this device
+        :param store: VerdictStore
+        :param trigger_parameters: Datafile parameters the tests depend on
+        :return: None
+        """
+        key = device_key(uut)
+        record = {"parameters": digest(trigger_parameters),
+                  "config_change": last_config_change(uut)}
+        previous = store.get(key) or {}
+
+        reused_verdict = None
+        if previous.get("result") == "passed" \
+                and previous.get("parameters") == record["parameters"]:
+            if record["config_change"] \
+                    and record["config_change"] == previous.get("config_change"):
+                record["sections"] = previous.get("sections")
+            else:
+                record["sections"] = self.sections_digest(device_config)
+
+            if record["sections"] == previous.get("sections"):
+                record["evaluated_at"] = previous.get("evaluated_at")
+                reused_verdict = ("Device inputs unchanged since "
+                                  f"{record['evaluated_at']}, reusing verdict")
+                logger.info(reused_verdict)
+
+        self.parameters.update(reused_verdict=reused_verdict,
+                               verdict_state={"store": store,
+                                              "key": key,
+                                              "record": record})
+
     @aetest.test
     def test_ospf_process_configured(self,
                                      running_config,
-                                     ospf_process_id):
+                                     ospf_process_id,
+                                     reused_verdict=None):
         """
         Test that the desired OSPF process is configured on the device. Given
         the learned running-config object, get the dictionary value for
@@ -69,10 +200,15 @@ class TestOspfConfigState(Trigger):
         parameter is created, named "ospf_config". Otherwise, fail
         the test.
 
-        :param running_config: Genie-learned device configuration
+        :param running_config: Device configuration (SectionConfig)
         :param ospf_process_id: Trigger parameter for desired OSPF process ID
+        :param reused_verdict: Reason for reusing the previous verdict
+            (set by prepare_test in incremental mode)
         :return: None
         """
+        if reused_verdict:
+            self.passed(reused_verdict)
+
         # Arrange: prepare the configuration line to match
 
         # router ospf <pid>
@@ -94,7 +230,8 @@ class TestOspfConfigState(Trigger):
     @aetest.test
     def test_ospf_router_id_configured(self,
                                        ospf_router_id,
-                                       ospf_config=()):
+                                       ospf_config=(),
+                                       reused_verdict=None):
         """
         Test that the desired OSPF router ID is configured on the device.
 
@@ -102,8 +239,13 @@ class TestOspfConfigState(Trigger):
         :param ospf_config: Learned OSPF config from
             test_ospf_process_configured. If no config was learned, default
             to an empty tuple (()).
+        :param reused_verdict: Reason for reusing the previous verdict
+            (set by prepare_test in incremental mode)
         :return: None
         """
+        if reused_verdict:
+            self.passed(reused_verdict)
+
         # Create the config line to test:
         # router-id <rid>
         router_id_line = f"router-id {ospf_router_id}"
@@ -121,7 +263,8 @@ class TestOspfConfigState(Trigger):
                                           tunnel_interface,
                                           ospf_process_id,
                                           tunnel_ospf_area,
-                                          tunnel_interface_enabled):
+                                          tunnel_interface_enabled,
+                                          reused_verdict=None):
         """
         Test that the tunnel interface is configured as follows:
           - "ip ospf <ospf_process_id> area <tunnel_ospf_area>"
@@ -134,14 +277,18 @@ class TestOspfConfigState(Trigger):
         executed, but that's not the case with the pyATS Learn feature.
 
         :param steps: aetest built-in "steps" class to group test results.
-        :param running_config: Genie-learned device configuration
+        :param running_config: Device configuration (SectionConfig)
         :param tunnel_interface: Datafile parameter for the tunnel interface
         :param ospf_process_id: Datafile parameter value for OSPF PID
         :param tunnel_ospf_area: Datafile parameter for Tunnel OSPF area
         :param tunnel_interface_enabled: Datafile parameter for Tunnel
             interface state. True = "no shutdown", False = "shutdown".
+        :param reused_verdict: Reason for reusing the previous verdict
+            (set by prepare_test in incremental mode)
         :return: None
         """
+        if reused_verdict:
+            self.passed(reused_verdict)
 
         # interface TunnelN
         expected_config_section = f"interface {tunnel_interface}"
@@ -171,13 +318,92 @@ class TestOspfConfigState(Trigger):
             assert interface_state_config_line in interface_config, \
                 f"Expected config '{interface_state_config_line}' not present"
 
+    @aetest.test
+    def test_config_policy(self,
+                           steps,
+                           running_config,
+                           config_policy=None,
+                           reused_verdict=None):
+        """
+        Test the declarative config policy from the datafile: expected lines,
+        forbidden lines and regex patterns per config section. Every rule of
+        a section is evaluated in one pass over that section.
+
+        :param steps: aetest built-in "steps" class to group test results.
+        :param running_config: Device configuration (SectionConfig)
+        :param config_policy: Declarative config policy (from datafile,
+            default None). See config_policy.py.
+        :param reused_verdict: Reason for reusing the previous verdict
+            (set by prepare_test in incremental mode)
+        :return: None
+        """
+        if reused_verdict:
+            self.passed(reused_verdict)
+
+        if not config_policy:
+            self.skipped("No config_policy in the trigger datafile")
+
+        compiled = compile_policy(config_policy, self.parameters)
+        violations = evaluate_policy(compiled, running_config)
+        logger.info("Evaluated %d rule(s) in %d section(s), %d violation(s)",
+                    sum(len(section_policy.expected)
+                        + len(section_policy.forbidden)
+                        + len(section_policy.patterns) for section_policy in compiled),
+                    len(compiled),
+                    sum(len(section_violations) for section_violations in violations.values()))
+
+        for section, section_violations in violations.items():
+            with steps.start(section, continue_=True):
+                assert not section_violations, \
+                    "; ".join(f"{violation.kind}: '{violation.rule}'"
+                              for violation in section_violations)
+
     @aetest.cleanup
-    def test_cleanup(self):
+    def test_cleanup(self,
+                     uut,
+                     running_config=None,
+                     verdict_state=None,
+                     state_store=None,
+                     config_change=None):
         """
-        Example cleanup method for this testscript. Nothing is performed here.
+        Cleanup method for this testscript. In incremental mode, store this
+        device's verdict and input hashes for the next run. If a state store
+        is configured, write the retrieved config sections to it. Both are
+        skipped if setup did not retrieve the configuration.
 
+        :param uut: Testbed device object for this trigger
+        :param running_config: Device configuration (SectionConfig), set by
+            prepare_test
+        :param verdict_state: Incremental mode state set by prepare_test
+        :param state_store: State store directory (from datafile, default
+            None). See state_store.py.
+        :param config_change: "Last configuration change" stamp read by
+            prepare_test when a state store is configured
         :return: None
         """
+        if running_config is None:
+            logger.warning("No configuration was retrieved for '%s', "
+                           "not recording a verdict or state", uut.name)
+            verdict_state = state_store = None
+
+        if state_store:
+            writer = StateStore(state_store).writer(device_key(uut))
+            # Replace every stored section, so none outlives its stamp
+            writer.add(("config",), {section: running_config.get(section)
+                                     for section in running_config})
+            writer.add(("config_change",), config_change)
+            writer.write()
+
+        if verdict_state is not None:
+            record = verdict_state["record"]
+            if not record.get("sections"):
+                record["sections"] = self.sections_digest(running_config)
+            if not record.get("evaluated_at"):
+                record["evaluated_at"] = datetime.now(timezone.utc).isoformat()
+            verdict_state["store"].put(verdict_state["key"],
+                                       {**record, "result": str(self.result)})
+
         # Nothing is being performed, but the cleanup section will be executed
         # at the end of the test
         logger.info("All tests for this device have completed.")
+        CACHE.log_stats()
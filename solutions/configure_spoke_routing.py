@@ -30,6 +30,10 @@ from genie.harness.base import Trigger
 from pyats import aetest
 from unicon.core.errors import SubCommandFailure
 
+from config_batch import ConfigBatch
+from instrumentation import instrument
+from section_config import SectionConfig, ospf_sections
+
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -41,17 +45,79 @@ class ConfigureSpokeOspf(Trigger):
     over the Tunnel interface. This script is provided for convenience and
     expedience when delivering a 45-minute workshop; the intent is to have
     tests fail and then succeed after running this trigger.
+
+    When the datafile sets "batch_config: true", each test queues its change
+    instead of calling the Genie API, and commit_config_batch pushes all of
+    them to the device in a single config session.
+
+    When the datafile sets "diff_config: true", the "router ospf <pid>" and
+    "interface <tunnel>" sections are learned once and only the lines still
+    missing from them are queued and pushed. A compliant device gets no
+    config-mode session at all.
     """
+    @aetest.setup
+    def prepare_config_batch(self, uut, ospf_process_id, tunnel_interface,
+                             batch_config=False, diff_config=False):
+        """
+        Instrument the device for metrics and create the configuration batch
+        when batched or diff mode is enabled. Once instrumented, every
+        configure() call drops the device's cached output (see
+        device_cache.invalidate_after_configure), so later triggers in the
+        job query the device again.
+
+        :param uut: pyATS device object from the trigger datafile.
+        :param ospf_process_id: Desired OSPF process ID (from datafile)
+        :param tunnel_interface: Tunnel interface to configure (from datafile)
+        :param batch_config: Queue the changes and push them in one config
+            session (from datafile, default False)
+        :param diff_config: Only push the lines missing from the running
+            config; implies batch_config (from datafile, default False)
+        :return: None
+        """
+        instrument(uut)
+
+        config_batch = None
+        if diff_config:
+            running_config = SectionConfig(uut, ospf_sections(ospf_process_id,
+                                                              tunnel_interface))
+            config_batch = ConfigBatch(running_config=running_config.prefetch())
+        elif batch_config:
+            config_batch = ConfigBatch()
+
+        self.parameters.update(config_batch=config_batch)
+
+    def queue_change(self, config_batch, name, section, *lines):
+        """
+        Queue a change in the configuration batch and end the calling test.
+
+        :param config_batch: ConfigBatch for this device
+        :param name: Name reported for this change
+        :param section: Parent config section
+        :param lines: Configuration lines to apply within the section
+        :return: None
+        """
+        if config_batch.add(name, section, *lines):
+            self.passed("Queued for batched commit")
+        self.passed("Already configured")
+
     @aetest.test
-    def configure_ospf_process(self, uut, ospf_process_id, ospf_router_id):
+    def configure_ospf_process(self, uut, ospf_process_id, ospf_router_id,
+                               config_batch=None):
         """
         Configure the OSPF process using a Genie API
 
         :param uut: pyATS device object from the trigger datafile.
         :param ospf_process_id: Desired OSPF process ID (from datafile)
         :param ospf_router_id: Desired OSPF router ID (from datafile)
+        :param config_batch: ConfigBatch when batched mode is enabled
         :return: None
         """
+        if config_batch is not None:
+            self.queue_change(config_batch,
+                              "configure_ospf_process",
+                              f"router ospf {ospf_process_id}",
+                              f"router-id {ospf_router_id}")
+
         try:
             uut.api.configure_ospf_routing(ospf_process_id=ospf_process_id,
                                            router_id=ospf_router_id,
@@ -60,7 +126,7 @@ class ConfigureSpokeOspf(Trigger):
             self.failed(f"Could not configure OSPF process: {err}")
 
     @aetest.test
-    def configure_ospf_default_passive(self, uut, ospf_process_id):
+    def configure_ospf_default_passive(self, uut, ospf_process_id, config_batch=None):
         """
         Configure OSPF process {ospf_process_id} to include
         "passive-interface default". This is the misconfiguration to be
@@ -68,8 +134,15 @@ class ConfigureSpokeOspf(Trigger):
 
         :param uut: pyATS device object from the trigger datafile.
         :param ospf_process_id: Desired OSPF process ID (from datafile)
+        :param config_batch: ConfigBatch when batched mode is enabled
         :return: None
         """
+        if config_batch is not None:
+            self.queue_change(config_batch,
+                              "configure_ospf_default_passive",
+                              f"router ospf {ospf_process_id}",
+                              "passive-interface default")
+
         try:
             uut.api.configure_ospf_passive_interface(ospf_process_id=ospf_process_id,
                                                      interface="default")
@@ -77,15 +150,23 @@ class ConfigureSpokeOspf(Trigger):
             self.failed(f"Unable to configure passive-interface default: {err}")
 
     @aetest.test
-    def configure_tunnel_ospf(self, uut, ospf_process_id, tunnel_interface, tunnel_ospf_area):
+    def configure_tunnel_ospf(self, uut, ospf_process_id, tunnel_interface, tunnel_ospf_area,
+                              config_batch=None):
         """
 
         :param uut: pyATS device object from the trigger datafile.
         :param ospf_process_id: Desired OSPF process ID (from datafile)
         :param tunnel_interface: Tunnel interface to configure (from datafile)
         :param tunnel_ospf_area: Desired tunnel OSPF area (from datafile)
+        :param config_batch: ConfigBatch when batched mode is enabled
         :return: None
         """
+        if config_batch is not None:
+            self.queue_change(config_batch,
+                              "configure_tunnel_ospf",
+                              f"interface {tunnel_interface}",
+                              f"ip ospf {ospf_process_id} area {tunnel_ospf_area}")
+
         try:
             uut.api.configure_ospf_routing_on_interface(ospf_process_id=ospf_process_id,
                                                         interface=tunnel_interface,
@@ -95,29 +176,73 @@ class ConfigureSpokeOspf(Trigger):
                         f"'{tunnel_interface}': {err}")
 
     @aetest.test
-    def enable_tunnel_interface(self, uut, tunnel_interface):
+    def enable_tunnel_interface(self, uut, tunnel_interface, config_batch=None):
         """
 
         :param uut: pyATS device object from the trigger datafile.
         :param tunnel_interface: Tunnel interface to configure (from datafile)
+        :param config_batch: ConfigBatch when batched mode is enabled
         :return: None
         """
+        if config_batch is not None:
+            self.queue_change(config_batch,
+                              "enable_tunnel_interface",
+                              f"interface {tunnel_interface}",
+                              "no shutdown")
+
         try:
             uut.api.unshut_interface(interface=tunnel_interface)
         except SubCommandFailure as err:
             self.failed(f"Unable to unshut interface '{tunnel_interface}': {err}")
 
     @aetest.test
-    def configure_tunnel_not_passive(self, uut, ospf_process_id, tunnel_interface):
+    def configure_tunnel_not_passive(self, uut, ospf_process_id, tunnel_interface,
+                                     config_batch=None):
         """
 
         :param uut: pyATS device object from the trigger datafile.
         :param ospf_process_id: Desired OSPF process ID (from datafile)
         :param tunnel_interface: Tunnel interface to configure (from datafile)
+        :param config_batch: ConfigBatch when batched mode is enabled
         :return: None
         """
+        if config_batch is not None:
+            self.queue_change(config_batch,
+                              "configure_tunnel_not_passive",
+                              f"router ospf {ospf_process_id}",
+                              f"no passive-interface {tunnel_interface}")
+
         try:
             uut.api.remove_ospf_passive_interface(ospf_process_id=ospf_process_id,
                                                   interface=tunnel_interface)
         except SubCommandFailure as err:
             self.failed(f"Unable to unconfigure passive-interface on '{tunnel_interface}': {err}")
+
+    @aetest.test
+    def commit_config_batch(self, uut, steps, config_batch=None):
+        """
+        Push every queued change to the device in a single config session.
+        The device is rolled back to its previous running-config if any line
+        is rejected. Each queued change is reported as a step.
+
+        :param uut: pyATS device object from the trigger datafile.
+        :param steps: aetest built-in "steps" class to group test results.
+        :param config_batch: ConfigBatch when batched mode is enabled
+        :return: None
+        """
+        if config_batch is None:
+            self.skipped("Batched configuration is not enabled")
+
+        if not config_batch.changes:
+            self.passed("Device configuration is already compliant")
+
+        failure = None
+        try:
+            config_batch.commit(uut)
+        except SubCommandFailure as err:
+            failure = err
+
+        for change in config_batch.changes:
+            with steps.start(change.name, continue_=True):
+                assert failure is None, \
+                    f"Batched configuration commit failed: {failure}"
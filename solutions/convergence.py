@@ -0,0 +1,135 @@
+"""
+Wait for OSPF convergence before running operational state assertions
+
+Developed for Cisco Live, DevNet Workshop DEVWKS-2539
+
+Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+__author__ = "Palmer Sample"
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import logging
+import time
+
+from genie.metaparser.util.exceptions import SchemaEmptyParserError, InvalidCommandError
+from unicon.core.errors import SubCommandFailure
+
+from device_cache import cached_parse
+from route_lookup import targeted_lookup
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def wait_for(check, timeout, interval=1.0, max_interval=10.0, backoff=2.0,
+             description="condition"):
+    """
+    Poll check() until it returns True or the timeout expires. The polling
+    interval starts at "interval" and grows by "backoff" after every failed
+    attempt, up to "max_interval", without sleeping past the deadline.
+
+    :param check: Callable returning True once the condition is met
+    :param timeout: Overall deadline in seconds
+    :param interval: Initial polling interval in seconds
+    :param max_interval: Maximum polling interval in seconds
+    :param backoff: Interval multiplier applied after each attempt
+    :param description: Condition name used in log messages
+    :return: True if the condition was met before the deadline
+    """
+    deadline = time.monotonic() + timeout
+    attempt = 0
+    while True:
+        attempt += 1
+        if check():
+            logger.info("%s met after %d attempt(s)", description, attempt)
+            return True
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logger.warning("%s not met after %d attempt(s), %gs deadline reached",
+                           description, attempt, timeout)
+            return False
+
+        logger.info("%s not met (attempt %d), retrying in %.1fs",
+                    description, attempt, min(interval, remaining))
+        time.sleep(min(interval, remaining))
+        interval = min(interval * backoff, max_interval)
+
+
+def ospf_neighbor_full(uut, interface):
+    """
+    Check whether an OSPF neighbor on the interface has reached FULL state.
+    Always queries the device (bypasses the device cache).
+
+    :param uut: Testbed device object
+    :param interface: Interface name, e.g. "Tunnel1"
+    :return: True if at least one neighbor is FULL
+    """
+    try:
+        neighbors = cached_parse(uut, "show ip ospf neighbor", ttl=0)
+    except (SubCommandFailure,
+            SchemaEmptyParserError,
+            InvalidCommandError):
+        return False
+
+    interface_neighbors = neighbors.get("interfaces", {}) \
+                                   .get(interface, {}) \
+                                   .get("neighbors", {})
+    return any(neighbor.get("state", "").upper().startswith("FULL")
+               for neighbor in interface_neighbors.values())
+
+
+def route_present(uut, prefix):
+    """
+    Check whether an OSPF route for the prefix is installed. Always queries
+    the device (bypasses the device cache).
+
+    :param uut: Testbed device object
+    :param prefix: Expected prefix, e.g. "172.16.1.254/32"
+    :return: True if the route is present
+    """
+    try:
+        return targeted_lookup(uut, prefix, ttl=0) is not None
+    except (SubCommandFailure, InvalidCommandError):
+        return False
+
+
+def wait_for_ospf_convergence(uut, interfaces, prefix, timeout, **backoff):
+    """
+    Wait until every interface has a FULL OSPF adjacency and the expected
+    prefix is in the RIB, or the timeout expires.
+
+    :param uut: Testbed device object
+    :param interfaces: Interfaces expected to form adjacencies
+    :param prefix: Prefix expected once OSPF has converged
+    :param timeout: Overall deadline in seconds
+    :param backoff: interval/max_interval/backoff arguments for wait_for()
+    :return: True if converged before the deadline
+    """
+    deadline = time.monotonic() + timeout
+
+    for interface in interfaces:
+        if not wait_for(lambda interface=interface: ospf_neighbor_full(uut, interface),
+                        max(deadline - time.monotonic(), 0),
+                        description=f"OSPF adjacency on {interface}",
+                        **backoff):
+            return False
+
+    return wait_for(lambda: route_present(uut, prefix),
+                    max(deadline - time.monotonic(), 0),
+                    description=f"Route {prefix}",
+                    **backoff)
@@ -0,0 +1,304 @@
+"""
+Job-scoped device command cache shared by the workshop triggers
+
+Developed for Cisco Live, DevNet Workshop DEVWKS-2539
+
+Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+__author__ = "Palmer Sample"
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from instrumentation import METRICS, add_configure_hook, instrument
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Default time-to-live (seconds) for cached device output. Override for the
+# whole job with the DEVICE_CACHE_TTL environment variable, or per call with
+# the "ttl" argument of the helper functions below.
+DEFAULT_TTL = float(os.environ.get("DEVICE_CACHE_TTL", 300))
+
+# Maximum number of parsed results kept by the parse cache. Override with
+# the PARSE_CACHE_SIZE environment variable.
+PARSE_CACHE_SIZE = int(os.environ.get("PARSE_CACHE_SIZE", 1024))
+
+
+class DeviceCache:
+    """
+    Cache of device output keyed by device name and command.
+
+    Every trigger in a gRun job runs in the same Easypy task process, so a
+    module-level instance is shared by all of them for the life of the job.
+    Entries expire after their TTL and are dropped for a device as soon as
+    anything calls its configure() method, see invalidate_after_configure().
+
+    Safe to use from several threads, e.g. when op state is collected over
+    concurrent sessions. Concurrent misses for the same key both fetch.
+    """
+    def __init__(self, default_ttl=DEFAULT_TTL):
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get_or_fetch(self, device_name, key, fetch, ttl=None):
+        """
+        Return the cached value for (device_name, key), calling fetch() to
+        populate the entry when it is missing or expired.
+
+        Exceptions raised by fetch() are not cached.
+
+        :param device_name: Name of the testbed device
+        :param key: Hashable key identifying the command/API call
+        :param fetch: Callable returning the value from the device
+        :param ttl: Entry lifetime in seconds; None uses the default TTL,
+            0 bypasses the cache for this call.
+        :return: Cached or freshly fetched value
+        """
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((device_name, key))
+            hit = entry is not None and ttl and now < entry[0]
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if hit:
+            logger.debug("Cache hit for %s: %s", device_name, key)
+            METRICS.cache_hit(device_name, key[0], key[1])
+            return entry[1]
+
+        logger.debug("Cache miss for %s: %s", device_name, key)
+        value = fetch()
+        if ttl:
+            with self._lock:
+                self._entries[(device_name, key)] = (now + ttl, value)
+        return value
+
+    def invalidate(self, device_name):
+        """
+        Drop every cached entry for a device, e.g. after its configuration
+        has been changed.
+
+        :param device_name: Name of the testbed device
+        :return: Number of entries removed
+        """
+        with self._lock:
+            stale = [cache_key for cache_key in self._entries
+                     if cache_key[0] == device_name]
+            for cache_key in stale:
+                del self._entries[cache_key]
+            self.invalidations += 1
+
+        if stale:
+            logger.info("Invalidated %d cached entries for '%s'",
+                        len(stale), device_name)
+        return len(stale)
+
+    def clear(self):
+        """
+        Drop all cached entries and reset the counters.
+
+        :return: None
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.invalidations = 0
+
+    def stats(self):
+        """
+        Cache hit/miss counters for reporting.
+
+        :return: dict of counters
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": len(self._entries),
+            "invalidations": self.invalidations,
+        }
+
+    def log_stats(self):
+        """
+        Log the current cache counters.
+
+        :return: None
+        """
+        stats = self.stats()
+        logger.info("Device cache: %d hits, %d misses (hit ratio %.1f%%), "
+                    "%d entries, %d invalidations",
+                    stats["hits"],
+                    stats["misses"],
+                    stats["hit_ratio"] * 100,
+                    stats["entries"],
+                    stats["invalidations"])
+        logger.info("Parse cache: %d hits, %d misses",
+                    PARSE_CACHE.hits,
+                    PARSE_CACHE.misses)
+
+
+class ParseCache:
+    """
+    Cache of parsed results keyed by parser and a hash of the raw output, so
+    identical output is parsed once. Parsers that only read the output (e.g.
+    the fast-path parsers) share results between devices. Genie parsers may
+    send follow-up commands to the device, so their key includes the device
+    name and results are only reused across polls of the same device.
+    The least recently used entry is dropped beyond max_entries.
+
+    Cached results are shared between callers and must not be modified.
+    """
+    def __init__(self, max_entries=PARSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_parse(self, parser, output, parse):
+        """
+        Return the cached result of parsing output with parser, calling
+        parse() to populate the entry when it is missing.
+
+        :param parser: Hashable parser identity, e.g. ("fast", command) or
+            ("genie", device name, os, command)
+        :param output: Raw command output
+        :param parse: Callable returning the parsed output
+        :return: Cached or freshly parsed value
+        """
+        key = (parser, hashlib.sha256(output.encode("utf-8")).digest())
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                # Move to the end of the (insertion-ordered) dict: most recent
+                value = self._entries[key] = self._entries.pop(key)
+                return value
+            self.misses += 1
+
+        value = parse()
+        with self._lock:
+            self._entries[key] = value
+            if len(self._entries) > self.max_entries:
+                del self._entries[next(iter(self._entries))]
+        return value
+
+    def clear(self):
+        """
+        Drop all cached entries and reset the counters.
+
+        :return: None
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+# Job-scoped caches shared by every trigger
+CACHE = DeviceCache()
+PARSE_CACHE = ParseCache()
+
+
+def invalidate_after_configure(uut):
+    """
+    Configure hook: the device configuration has (potentially) changed, so
+    drop its cached output. Devices are instrumented before their first
+    cached lookup, so every device with cache entries runs this hook.
+
+    :param uut: Testbed device object
+    :return: None
+    """
+    CACHE.invalidate(uut.name)
+
+
+add_configure_hook(invalidate_after_configure)
+
+
+def cached_execute(uut, command, ttl=None):
+    """
+    Cached equivalent of uut.execute(command)
+
+    :param uut: Testbed device object
+    :param command: CLI command to execute
+    :param ttl: Optional TTL override in seconds
+    :return: Raw command output
+    """
+    instrument(uut)
+    return CACHE.get_or_fetch(uut.name,
+                              ("execute", command),
+                              lambda: uut.execute(command),
+                              ttl=ttl)
+
+
+def cached_parse(uut, command, ttl=None, parse_as=None):
+    """
+    Cached equivalent of uut.parse(command). The raw output is retrieved
+    with cached_execute() and only parsed if the parse cache has not seen
+    identical output for this command from this device before.
+
+    :param uut: Testbed device object
+    :param command: CLI command to parse
+    :param ttl: Optional TTL override in seconds
+    :param parse_as: Command whose Genie parser reads the output, if it
+        differs from the executed command (e.g. arguments the parser does
+        not model)
+    :return: Parsed output
+    """
+    parse_as = parse_as or command
+
+    def fetch():
+        output = cached_execute(uut, command, ttl=ttl)
+        return PARSE_CACHE.get_or_parse(("genie", uut.name, uut.os, parse_as),
+                                        output,
+                                        lambda: uut.parse(parse_as, output=output))
+
+    instrument(uut)
+    return CACHE.get_or_fetch(uut.name,
+                              ("parse", command),
+                              fetch,
+                              ttl=ttl)
+
+
+def cached_api(uut, api_name, ttl=None, **kwargs):
+    """
+    Cached equivalent of uut.api.<api_name>(**kwargs). Only use this for
+    read-only (get_*) APIs.
+
+    :param uut: Testbed device object
+    :param api_name: Name of the Genie API function
+    :param ttl: Optional TTL override in seconds
+    :param kwargs: Keyword arguments passed to the API
+    :return: API return value
+    """
+    instrument(uut)
+    api = getattr(uut.api, api_name)
+    return CACHE.get_or_fetch(uut.name,
+                              ("api", api_name, tuple(sorted(kwargs.items()))),
+                              lambda: METRICS.call(uut.name, "api", api_name,
+                                                   api, **kwargs),
+                              ttl=ttl)
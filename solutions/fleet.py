@@ -0,0 +1,395 @@
+"""
+Fleet runner: execute the Easypy job against many pods in parallel
+
+Developed for Cisco Live, DevNet Workshop DEVWKS-2539
+
+Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+The testbed and trigger datafiles describe a single spoke ("devnet-rtr")
+templated from %ENV{POD_NUMBER} and %ENV{RTR_DNS_NAME}. This script shards
+a list of pods into groups and runs "pyats run job" once per pod, with the
+environment set up the same way prepare_lab.sh does. At most --concurrency
+pyATS worker processes run at once; each group is handled by one worker
+slot, so --group-size 1 gives one worker per device. --rate caps how many
+pod jobs start per second, e.g. to spare the proxy and AAA servers.
+
+Per-pod results are merged into a single JSON report.
+
+With --fleet-template, per-pod trigger parameters come from a compact fleet
+template (see fleet_datafile.py). The template is compiled once before the
+pods start, and the pod list defaults to the pods it defines.
+
+Example:
+    python fleet.py --pods 1-250 --concurrency 32 --report fleet.json
+    python fleet.py --fleet-template fleet_template.yml --concurrency 32
+"""
+
+__author__ = "Palmer Sample"
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import argparse
+import glob
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+TEST_PATH = os.path.dirname(os.path.abspath(__file__))
+
+RESULT_KEYS = ("passed", "failed", "errored", "aborted", "blocked",
+               "skipped", "passx", "total")
+
+
+class RateLimiter:
+    """
+    Space out events to at most "rate" per second across threads.
+    """
+    def __init__(self, rate=0):
+        """
+        :param rate: Maximum events per second; 0 disables the limit
+        """
+        self.interval = 1.0 / rate if rate else 0.0
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self):
+        """
+        Block until the next event is allowed.
+
+        :return: None
+        """
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next, now)
+            self._next = start + self.interval
+        time.sleep(start - now)
+
+
+def parse_pods(pod_spec, keep_order=False):
+    """
+    Expand a pod specification such as "1-10,15,20-22" into a sorted list
+    of pod numbers.
+
+    :param pod_spec: Comma-separated pod numbers and/or ranges
+    :param keep_order: Keep the order of the specification instead of
+        sorting (duplicates are still dropped)
+    :return: list of int
+    """
+    pods = {}
+    for item in pod_spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        if "-" in item:
+            start, end = (int(value) for value in item.split("-", 1))
+            pods.update(dict.fromkeys(range(start, end + 1)))
+        else:
+            pods[int(item)] = None
+    return list(pods) if keep_order else sorted(pods)
+
+
+def shard(pods, group_size):
+    """
+    Split the pod list into groups of at most group_size pods.
+
+    :param pods: list of pod numbers
+    :param group_size: Maximum number of pods per group
+    :return: list of lists
+    """
+    return [pods[index:index + group_size]
+            for index in range(0, len(pods), group_size)]
+
+
+def pod_environment(pod, dns_domain):
+    """
+    Build the environment for a single pod, mirroring prepare_lab.sh
+
+    :param pod: Pod number
+    :param dns_domain: Lab DNS domain
+    :return: dict of environment variables
+    """
+    env = dict(os.environ)
+    env.update(POD_NUMBER=str(pod),
+               RTR_DNS_NAME=f"pod{pod}-rtr.{dns_domain}",
+               PROXY_DNS_NAME=f"proxy.{dns_domain}",
+               DNS_DOMAIN=dns_domain,
+               # testbed.yml resolves the SSH config relative to %ENV{PWD}
+               PWD=TEST_PATH)
+    return env
+
+
+def read_summary(archive_dir):
+    """
+    Extract the result summary from the newest Easypy archive written for
+    a pod.
+
+    :param archive_dir: Directory passed to --archive-dir
+    :return: dict of result counters (empty if no archive was found)
+    """
+    archives = glob.glob(os.path.join(archive_dir, "*.zip"))
+    if not archives:
+        return {}
+    with zipfile.ZipFile(max(archives, key=os.path.getmtime)) as archive_file:
+        for name in archive_file.namelist():
+            if os.path.basename(name) == "results.json":
+                results = json.loads(archive_file.read(name))
+                summary = results.get("report", {}).get("summary", {})
+                return {key: summary.get(key, 0) for key in RESULT_KEYS}
+    return {}
+
+
+def run_pod(pod, job_file, dns_domain, output_dir, extra_args=(), limiter=None):
+    """
+    Run the Easypy job for one pod and collect its result.
+
+    :param pod: Pod number
+    :param job_file: Path to the Easypy job file
+    :param dns_domain: Lab DNS domain
+    :param output_dir: Base directory for per-pod archives. Every run gets
+        a fresh directory below output_dir/pod<N>, so archives left by
+        earlier runs cannot decide the result.
+    :param extra_args: Additional arguments passed to "pyats run job"
+    :param limiter: Optional RateLimiter for job starts
+    :return: dict describing the pod result
+    """
+    if limiter is not None:
+        limiter.wait()
+
+    pod_dir = os.path.join(output_dir, f"pod{pod}")
+    os.makedirs(pod_dir, exist_ok=True)
+    archive_dir = tempfile.mkdtemp(prefix=time.strftime("%Y%m%d-%H%M%S-"), dir=pod_dir)
+
+    command = ["pyats", "run", "job", job_file,
+               "--no-mail",
+               "--archive-dir", archive_dir,
+               *extra_args]
+
+    start = time.monotonic()
+    with open(os.path.join(archive_dir, "console.log"), "w",
+              encoding="utf-8") as console:
+        process = subprocess.run(command,
+                                 cwd=TEST_PATH,
+                                 env=pod_environment(pod, dns_domain),
+                                 stdout=console,
+                                 stderr=subprocess.STDOUT,
+                                 check=False)
+    duration = time.monotonic() - start
+
+    summary = read_summary(archive_dir)
+    passed = (process.returncode == 0
+              and bool(summary)
+              and not summary.get("failed")
+              and not summary.get("errored"))
+    return {
+        "pod": pod,
+        "device": f"pod{pod}-rtr.{dns_domain}",
+        "returncode": process.returncode,
+        "duration": round(duration, 3),
+        "summary": summary,
+        "result": "passed" if passed else "failed",
+        "archive_dir": archive_dir,
+    }
+
+
+def errored_pod(pod, dns_domain, err):
+    """
+    Result of a pod whose job could not be run or whose archive could not
+    be read.
+
+    :param pod: Pod number
+    :param dns_domain: Lab DNS domain
+    :param err: Exception raised by run_pod()
+    :return: dict describing the pod result
+    """
+    return {
+        "pod": pod,
+        "device": f"pod{pod}-rtr.{dns_domain}",
+        "returncode": None,
+        "duration": 0.0,
+        "summary": {},
+        "result": "errored",
+        "error": f"{type(err).__name__}: {err}",
+    }
+
+
+def run_group(pods, **kwargs):
+    """
+    Run a group of pods sequentially within a single worker slot. A pod
+    whose run raises (e.g. OSError starting pyats, a corrupt archive) is
+    recorded as errored and the group carries on.
+
+    :param pods: list of pod numbers
+    :param kwargs: Keyword arguments passed to run_pod()
+    :return: list of pod results
+    """
+    results = []
+    for pod in pods:
+        try:
+            results.append(run_pod(pod, **kwargs))
+        except Exception as err:  # pylint: disable=broad-except
+            logger.error("Pod %s errored: %s", pod, err)
+            results.append(errored_pod(pod, kwargs.get("dns_domain"), err))
+    return results
+
+
+def merge_results(pod_results, wall_time):
+    """
+    Merge per-pod results into a single fleet report.
+
+    :param pod_results: list of pod result dicts
+    :param wall_time: Elapsed wall-clock time of the fleet run
+    :return: dict
+    """
+    totals = {key: 0 for key in RESULT_KEYS}
+    for pod_result in pod_results:
+        for key in RESULT_KEYS:
+            totals[key] += pod_result["summary"].get(key, 0)
+
+    durations = [pod_result["duration"] for pod_result in pod_results]
+    return {
+        "devices": len(pod_results),
+        "devices_passed": sum(1 for pod_result in pod_results
+                              if pod_result["result"] == "passed"),
+        "devices_failed": [pod_result["device"] for pod_result in pod_results
+                           if pod_result["result"] != "passed"],
+        "totals": totals,
+        "wall_time": round(wall_time, 3),
+        "slowest_device": max(durations, default=0),
+        "sum_of_device_time": round(sum(durations), 3),
+        "results": sorted(pod_results, key=lambda pod_result: pod_result["pod"]),
+    }
+
+
+def run_fleet(pods, concurrency, group_size=1, rate=0, **kwargs):
+    """
+    Run the job against every pod using at most "concurrency" parallel
+    worker slots.
+
+    :param pods: list of pod numbers
+    :param concurrency: Maximum number of concurrent pyATS processes
+    :param group_size: Number of pods handled sequentially per worker slot
+    :param rate: Maximum pod jobs started per second; 0 for no limit
+    :param kwargs: Keyword arguments passed to run_pod()
+    :return: Merged fleet report
+    """
+    groups = shard(pods, group_size)
+    logger.info("Running %d pods in %d groups, concurrency %d",
+                len(pods), len(groups), concurrency)
+    kwargs.setdefault("limiter", RateLimiter(rate))
+
+    start = time.monotonic()
+    pod_results = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(run_group, group, **kwargs): group
+                   for group in groups}
+        for future in as_completed(futures):
+            try:
+                group_results = future.result()
+            except Exception as err:  # pylint: disable=broad-except
+                group_results = [errored_pod(pod, kwargs.get("dns_domain"), err)
+                                 for pod in futures[future]]
+            for pod_result in group_results:
+                logger.info("%-40s %-8s %7.1fs",
+                            pod_result["device"],
+                            pod_result["result"].upper(),
+                            pod_result["duration"])
+                pod_results.append(pod_result)
+
+    return merge_results(pod_results, time.monotonic() - start)
+
+
+def main():
+    """
+    Command line entry point
+
+    :return: Process exit code
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--pods",
+                        help='Pods to test, e.g. "1-100,120" '
+                             '(default: every pod in --fleet-template)')
+    parser.add_argument("--fleet-template",
+                        help="Fleet template providing per-pod trigger parameters")
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="Maximum number of concurrent pyATS jobs")
+    parser.add_argument("--group-size", type=int, default=1,
+                        help="Pods run sequentially per worker slot")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="Maximum pod jobs started per second (default: no limit)")
+    parser.add_argument("--job", default=os.path.join(TEST_PATH, "job.py"),
+                        help="Easypy job file")
+    parser.add_argument("--dns-domain", default=os.environ.get("DNS_DOMAIN"),
+                        help="Lab DNS domain (default: $DNS_DOMAIN)")
+    parser.add_argument("--output-dir", default=os.path.join(TEST_PATH, "fleet_runs"),
+                        help="Directory for per-pod archives")
+    parser.add_argument("--report", default="fleet_report.json",
+                        help="Merged JSON report file")
+    args, extra_args = parser.parse_known_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if not args.dns_domain:
+        parser.error("--dns-domain or the DNS_DOMAIN environment variable is required")
+    if not args.pods and not args.fleet_template:
+        parser.error("--pods or --fleet-template is required")
+
+    pods = parse_pods(args.pods) if args.pods else []
+    if args.fleet_template:
+        # Imported here, as fleet_datafile imports parse_pods from this module
+        from fleet_datafile import load_fleet  # pylint: disable=import-outside-toplevel
+
+        # Compile once up front so every pod job loads the cached expansion
+        template = os.path.abspath(args.fleet_template)
+        pods = pods or sorted(load_fleet(template))
+        extra_args = ["--fleet-template", template, *extra_args]
+
+    report = run_fleet(pods,
+                       concurrency=max(1, args.concurrency),
+                       group_size=max(1, args.group_size),
+                       rate=args.rate,
+                       job_file=os.path.abspath(args.job),
+                       dns_domain=args.dns_domain,
+                       output_dir=os.path.abspath(args.output_dir),
+                       extra_args=extra_args)
+
+    with open(args.report, "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, indent=2)
+
+    logger.info("%d/%d devices passed in %.1fs (slowest device %.1fs, "
+                "sequential estimate %.1fs). Report: %s",
+                report["devices_passed"],
+                report["devices"],
+                report["wall_time"],
+                report["slowest_device"],
+                report["sum_of_device_time"],
+                args.report)
+
+    return 0 if not report["devices_failed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,337 @@
+"""
+Fleet-wide OSPF consistency analysis over the state store
+
+Developed for Cisco Live, DevNet Workshop DEVWKS-2539
+
+Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+The triggers check each spoke on its own. This stage loads the OSPF facts
+TestOspfOpState wrote to the state store (see state_store.py) for the
+whole fleet into array-backed tables, and runs checks that need the
+fleet-wide view:
+
+    duplicate_router_ids   router-id used by more than one device
+    area_mismatches        interface whose OSPF area differs from the area
+                           most devices use on that interface (or from
+                           --expected-area)
+    interface_state        tested tunnel interface whose enabled/line
+                           protocol state differs from the datafile's
+                           tunnel_interface_enabled, or that is passive
+    missing_hub_adjacency  device without a FULL adjacency to the hub, or
+                           (if the hub is in the store) missing from the
+                           hub's neighbor list
+    unreachable_prefixes   expected prefix not in the device's OSPF routes
+
+Every check is a handful of numpy operations over the tables; there are
+no per-device-pair Python loops. numpy is only needed for this stage.
+
+Example:
+    python fleet_analysis.py state --hub-router-id 172.16.1.254 \\
+        --report fleet_analysis.json
+"""
+
+__author__ = "Palmer Sample"
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import argparse
+import ipaddress
+import json
+import logging
+import sys
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+from state_store import StateStore
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def ip_to_int(address):
+    """
+    :param address: Dotted-decimal IPv4 address (or None)
+    :return: int, 0 if the address is missing or invalid
+    """
+    try:
+        return int(ipaddress.IPv4Address(address))
+    except (ipaddress.AddressValueError, ValueError, TypeError):
+        return 0
+
+
+def int_to_ip(value):
+    """
+    :param value: IPv4 address as int
+    :return: Dotted-decimal str
+    """
+    return str(ipaddress.IPv4Address(int(value)))
+
+
+class FleetTables:
+    """
+    Column-oriented OSPF facts for the whole fleet. Every row of the
+    interface, neighbor and route tables refers to its device by index.
+    """
+    def __init__(self, store):
+        """
+        Load the OSPF facts of every device in the store.
+
+        :param store: StateStore
+        """
+        devices = []
+        router_ids = []
+        interfaces = {"device": [], "name": [], "area": [],
+                      "enable": [], "line_protocol": [], "passive": [],
+                      "tested": [], "expected_up": []}
+        neighbors = {"device": [], "router_id": [], "full": []}
+        routes = {"device": [], "prefix": [], "present": []}
+
+        for device in store.devices():
+            with store.reader(device) as reader:
+                facts = reader.get(("ospf",))
+            if not facts:
+                continue
+
+            index = len(devices)
+            devices.append(device)
+            router_ids.append(ip_to_int(facts.get("router_id")))
+
+            # Interfaces checked by test_tunnel_interface_state, with the
+            # state expected for them; other OSPF interfaces (Loopback0, LAN)
+            # are passive on purpose
+            tested = facts.get("tested_interfaces") or {}
+            for name, interface in (facts.get("interfaces") or {}).items():
+                interfaces["tested"].append(name in tested)
+                interfaces["expected_up"].append(bool(tested.get(name, True)))
+                interfaces["device"].append(index)
+                interfaces["name"].append(name)
+                interfaces["area"].append(ip_to_int(interface.get("area")))
+                interfaces["enable"].append(bool(interface.get("enable")))
+                interfaces["line_protocol"].append(bool(interface.get("line_protocol")))
+                interfaces["passive"].append(bool(interface.get("passive")))
+
+            for interface_neighbors in (facts.get("neighbors") or {}).values():
+                for router_id, state in interface_neighbors.items():
+                    neighbors["device"].append(index)
+                    neighbors["router_id"].append(ip_to_int(router_id))
+                    neighbors["full"].append(str(state).upper().startswith("FULL"))
+
+            for prefix, match in (facts.get("routes") or {}).items():
+                routes["device"].append(index)
+                routes["prefix"].append(prefix)
+                routes["present"].append(match is not None)
+
+        self.devices = np.array(devices, dtype=object)
+        self.router_id = np.array(router_ids, dtype=np.uint32)
+        self.interfaces = {
+            "device": np.array(interfaces["device"], dtype=np.int64),
+            "name": np.array(interfaces["name"], dtype=object),
+            "area": np.array(interfaces["area"], dtype=np.uint32),
+            "enable": np.array(interfaces["enable"], dtype=bool),
+            "line_protocol": np.array(interfaces["line_protocol"], dtype=bool),
+            "passive": np.array(interfaces["passive"], dtype=bool),
+            "tested": np.array(interfaces["tested"], dtype=bool),
+            "expected_up": np.array(interfaces["expected_up"], dtype=bool),
+        }
+        self.neighbors = {
+            "device": np.array(neighbors["device"], dtype=np.int64),
+            "router_id": np.array(neighbors["router_id"], dtype=np.uint32),
+            "full": np.array(neighbors["full"], dtype=bool),
+        }
+        self.routes = {
+            "device": np.array(routes["device"], dtype=np.int64),
+            "prefix": np.array(routes["prefix"], dtype=object),
+            "present": np.array(routes["present"], dtype=bool),
+        }
+
+    def __len__(self):
+        return len(self.devices)
+
+
+def duplicate_router_ids(tables):
+    """
+    :param tables: FleetTables
+    :return: dict of router-id -> list of devices sharing it
+    """
+    known = np.flatnonzero(tables.router_id)
+    _, inverse, counts = np.unique(tables.router_id[known],
+                                   return_inverse=True, return_counts=True)
+    duplicated = known[counts[inverse] > 1]
+    order = np.argsort(tables.router_id[duplicated], kind="stable")
+    duplicated = duplicated[order]
+
+    groups, starts = np.unique(tables.router_id[duplicated], return_index=True)
+    return {int_to_ip(router_id): list(devices)
+            for router_id, devices in zip(groups,
+                                          np.split(tables.devices[duplicated], starts[1:]))}
+
+
+def area_mismatches(tables, expected_area=None):
+    """
+    :param tables: FleetTables
+    :param expected_area: Expected area for every interface; default is
+        the area most devices use on the same interface name
+    :return: list of dicts describing the mismatching interfaces
+    """
+    interfaces = tables.interfaces
+    if not len(interfaces["name"]):
+        return []
+
+    names, name_index = np.unique(interfaces["name"].astype(str), return_inverse=True)
+    if expected_area is not None:
+        expected = np.full(len(names), ip_to_int(expected_area), dtype=np.uint32)
+    else:
+        # Count each (name, area) pair, then keep the most frequent area per name
+        pairs = name_index.astype(np.uint64) << np.uint64(32) \
+            | interfaces["area"].astype(np.uint64)
+        unique_pairs, pair_counts = np.unique(pairs, return_counts=True)
+        pair_names = (unique_pairs >> np.uint64(32)).astype(np.int64)
+        order = np.lexsort((-pair_counts, pair_names))
+        _, first = np.unique(pair_names[order], return_index=True)
+        expected = (unique_pairs[order][first] & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+    mismatched = np.flatnonzero(interfaces["area"] != expected[name_index])
+    return [{"device": tables.devices[interfaces["device"][row]],
+             "interface": interfaces["name"][row],
+             "area": int_to_ip(interfaces["area"][row]),
+             "expected_area": int_to_ip(expected[name_index[row]])}
+            for row in mismatched]
+
+
+def interface_state(tables):
+    """
+    :param tables: FleetTables
+    :return: list of dicts describing tested interfaces whose state differs
+        from the expected state, or that are passive
+    """
+    interfaces = tables.interfaces
+    expected_up = interfaces["expected_up"]
+    bad = np.flatnonzero(interfaces["tested"]
+                         & ((interfaces["enable"] != expected_up)
+                            | (interfaces["line_protocol"] != expected_up)
+                            | interfaces["passive"]))
+    return [{"device": tables.devices[interfaces["device"][row]],
+             "interface": interfaces["name"][row],
+             "enable": bool(interfaces["enable"][row]),
+             "line_protocol": bool(interfaces["line_protocol"][row]),
+             "passive": bool(interfaces["passive"][row])}
+            for row in bad]
+
+
+def missing_hub_adjacency(tables, hub_router_id):
+    """
+    :param tables: FleetTables
+    :param hub_router_id: Router-id of the hub
+    :return: dict with "no_full_adjacency" (devices without a FULL
+        neighbor to the hub) and "missing_on_hub" (devices the hub does not
+        list as neighbors; only if the hub is in the store)
+    """
+    hub = ip_to_int(hub_router_id)
+    neighbors = tables.neighbors
+    spokes = tables.router_id != hub
+
+    adjacent = np.zeros(len(tables), dtype=bool)
+    adjacent[neighbors["device"][(neighbors["router_id"] == hub) & neighbors["full"]]] = True
+    result = {"no_full_adjacency": list(tables.devices[spokes & ~adjacent])}
+
+    hub_rows = np.flatnonzero(tables.router_id == hub)
+    if len(hub_rows):
+        hub_neighbors = neighbors["router_id"][np.isin(neighbors["device"], hub_rows)
+                                               & neighbors["full"]]
+        listed = np.isin(tables.router_id, hub_neighbors)
+        result["missing_on_hub"] = list(tables.devices[spokes & ~listed])
+    return result
+
+
+def unreachable_prefixes(tables):
+    """
+    :param tables: FleetTables
+    :return: dict of prefix -> list of devices without a route to it
+    """
+    routes = tables.routes
+    missing = np.flatnonzero(~routes["present"])
+    if not len(missing):
+        return {}
+    order = missing[np.argsort(routes["prefix"][missing].astype(str), kind="stable")]
+    prefixes, starts = np.unique(routes["prefix"][order].astype(str), return_index=True)
+    return {str(prefix): list(tables.devices[devices])
+            for prefix, devices in zip(prefixes,
+                                       np.split(routes["device"][order], starts[1:]))}
+
+
+def analyze(store, hub_router_id, expected_area=None):
+    """
+    Run every fleet check.
+
+    :param store: StateStore
+    :param hub_router_id: Router-id of the hub
+    :param expected_area: Optional expected OSPF area for every interface
+    :return: Analysis report
+    """
+    if np is None:
+        raise RuntimeError("Fleet analysis requires numpy: pip install numpy")
+
+    tables = FleetTables(store)
+    checks = {
+        "duplicate_router_ids": duplicate_router_ids(tables),
+        "area_mismatches": area_mismatches(tables, expected_area),
+        "interface_state": interface_state(tables),
+        "missing_hub_adjacency": missing_hub_adjacency(tables, hub_router_id),
+        "unreachable_prefixes": unreachable_prefixes(tables),
+    }
+    issues = (len(checks["duplicate_router_ids"])
+              + len(checks["area_mismatches"])
+              + len(checks["interface_state"])
+              + sum(len(devices) for devices in checks["missing_hub_adjacency"].values())
+              + len(checks["unreachable_prefixes"]))
+    return {"devices": len(tables), "issues": issues, "checks": checks}
+
+
+def main():
+    """
+    Command line entry point
+
+    :return: Process exit code
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("directory", help="State store directory")
+    parser.add_argument("--hub-router-id", default="172.16.1.254",
+                        help="Router-id of the hub")
+    parser.add_argument("--expected-area",
+                        help="Expected OSPF area (default: the fleet majority per interface)")
+    parser.add_argument("--report", default="fleet_analysis.json",
+                        help="JSON report file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    try:
+        report = analyze(StateStore(args.directory), args.hub_router_id, args.expected_area)
+    except RuntimeError as err:
+        parser.error(str(err))
+
+    with open(args.report, "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, indent=2, default=str)
+
+    logger.info("%d device(s) analyzed, %d issue(s). Report: %s",
+                report["devices"], report["issues"], args.report)
+    return 1 if report["issues"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
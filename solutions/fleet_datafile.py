@@ -0,0 +1,265 @@
+"""
+Compile a compact fleet template into per-pod trigger datafiles
+
+Developed for Cisco Live, DevNet Workshop DEVWKS-2539
+
+Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+A fleet template is a trigger datafile with an additional "fleet" section:
+
+    fleet:
+      pods: 1-250                 # and/or
+      inventory: inventory.csv    # one row per pod, "pod" column required
+      attributes:                 # shared by every trigger and device
+        ospf_router_id: "0.0.0.{pod}"
+
+String values may reference {pod} and any inventory column. A value that
+is exactly one placeholder, e.g. "{area}", keeps the column's YAML type.
+Only those names are substituted: any other braces, such as regular
+expression quantifiers ("\\d{1,3}") or the trigger parameter placeholders
+of a config_policy ("{ospf_router_id}"), are left as they are.
+Each trigger's devices_attributes only need what differs from the shared
+attributes.
+
+The expansion for every pod is compiled once and cached as a pickle in
+__pycache__ next to the template. The cache is rebuilt whenever the
+template or inventory file changes (size or modification time).
+
+Example:
+    python fleet_datafile.py fleet_template.yml --pod 12
+"""
+
+__author__ = "Palmer Sample"
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import argparse
+import csv
+import logging
+import os
+import pickle
+import re
+import sys
+import tempfile
+import time
+
+import yaml
+
+from fleet import parse_pods
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 2
+
+# Trigger datafile keys that are not triggers
+RESERVED_KEYS = ("fleet", "uids", "groups", "order", "extends", "parameters")
+
+PLACEHOLDER = re.compile(r"\{(\w+)\}")
+
+
+def source_fingerprint(paths):
+    """
+    Cheap change detection for the compiled cache.
+
+    :param paths: Source file paths
+    :return: tuple of (path, size, mtime_ns)
+    """
+    fingerprint = []
+    for path in paths:
+        stat = os.stat(path)
+        fingerprint.append((os.path.abspath(path), stat.st_size, stat.st_mtime_ns))
+    return tuple(fingerprint)
+
+
+def read_inventory(path):
+    """
+    Read the inventory CSV. Cells are loaded as YAML scalars so "4" becomes
+    an int and "true" a bool.
+
+    :param path: CSV file with a header row and a "pod" column
+    :return: dict of pod number -> dict of variables
+    """
+    inventory = {}
+    with open(path, newline="", encoding="utf-8") as inventory_file:
+        for row in csv.DictReader(inventory_file):
+            variables = {column.strip(): yaml.safe_load(value) if value.strip() else None
+                         for column, value in row.items()}
+            inventory[int(variables["pod"])] = variables
+    return inventory
+
+
+def resolve(value, variables):
+    """
+    Substitute template variables in a datafile value.
+
+    :param value: Datafile value (str, list, dict or scalar)
+    :param variables: dict of template variables
+    :return: Resolved value
+    """
+    if isinstance(value, str):
+        match = PLACEHOLDER.fullmatch(value)
+        if match and match.group(1) in variables:
+            return variables[match.group(1)]
+        return PLACEHOLDER.sub(lambda match: str(variables[match.group(1)])
+                               if match.group(1) in variables else match.group(0),
+                               value)
+    if isinstance(value, dict):
+        return {key: resolve(item, variables) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve(item, variables) for item in value]
+    return value
+
+
+def expand(template, variables):
+    """
+    Build the trigger datafile for one pod.
+
+    :param template: Loaded fleet template
+    :param variables: Template variables for the pod
+    :return: Trigger datafile dict
+    """
+    shared = template["fleet"].get("attributes", {})
+    datafile = {}
+    for key, section in template.items():
+        if key == "fleet":
+            continue
+        if key in RESERVED_KEYS or not isinstance(section, dict):
+            datafile[key] = section
+            continue
+
+        trigger = dict(section)
+        trigger["devices_attributes"] = {
+            device: resolve({**shared, **(attributes or {})}, variables)
+            for device, attributes in section.get("devices_attributes", {}).items()
+        }
+        for device in section.get("devices", []):
+            trigger["devices_attributes"].setdefault(device, resolve(shared, variables))
+        datafile[key] = trigger
+    return datafile
+
+
+def compile_template(template_path):
+    """
+    Expand the fleet template for every pod.
+
+    :param template_path: Path to the fleet template
+    :return: tuple of (source file list, dict of pod -> trigger datafile)
+    """
+    with open(template_path, encoding="utf-8") as template_file:
+        template = yaml.safe_load(template_file)
+
+    fleet = template.get("fleet") or {}
+    sources = [template_path]
+    pods = {pod: {} for pod in parse_pods(str(fleet.get("pods", "")))}
+    if fleet.get("inventory"):
+        inventory_path = os.path.join(os.path.dirname(template_path), fleet["inventory"])
+        sources.append(inventory_path)
+        for pod, row in read_inventory(inventory_path).items():
+            pods[pod] = row
+
+    template["fleet"] = fleet
+    compiled = {pod: expand(template, {**row, "pod": pod})
+                for pod, row in sorted(pods.items())}
+    return sources, compiled
+
+
+def cache_path(template_path):
+    """
+    :param template_path: Path to the fleet template
+    :return: Path of the compiled cache
+    """
+    directory, name = os.path.split(os.path.abspath(template_path))
+    return os.path.join(directory, "__pycache__", f"{name}.fleet.pickle")
+
+
+def load_fleet(template_path):
+    """
+    Return the expanded datafiles for every pod, from the compiled cache
+    when it is current, otherwise compiling and caching them.
+
+    :param template_path: Path to the fleet template
+    :return: dict of pod -> trigger datafile
+    """
+    path = cache_path(template_path)
+    try:
+        with open(path, "rb") as cache_file:
+            cached = pickle.load(cache_file)
+        if cached["version"] == CACHE_VERSION \
+                and cached["fingerprint"] == source_fingerprint(cached["sources"]):
+            return cached["pods"]
+    except (OSError, EOFError, KeyError, pickle.UnpicklingError):
+        pass
+
+    start = time.perf_counter()
+    sources, compiled = compile_template(template_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(handle, "wb") as cache_file:
+        pickle.dump({"version": CACHE_VERSION,
+                     "sources": sources,
+                     "fingerprint": source_fingerprint(sources),
+                     "pods": compiled},
+                    cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+    logger.info("Compiled %s for %d pods in %.3fs",
+                template_path, len(compiled), time.perf_counter() - start)
+    return compiled
+
+
+def write_pod_datafile(template_path, pod, directory):
+    """
+    Write the resolved trigger datafile for one pod.
+
+    :param template_path: Path to the fleet template
+    :param pod: Pod number
+    :param directory: Output directory
+    :return: Path of the datafile
+    """
+    fleet = load_fleet(template_path)
+    if pod not in fleet:
+        raise KeyError(f"Pod {pod} is not part of fleet template {template_path}")
+
+    datafile_path = os.path.join(directory, f"trigger_datafile_pod{pod}.yml")
+    with open(datafile_path, "w", encoding="utf-8") as datafile:
+        yaml.safe_dump(fleet[pod], datafile, sort_keys=False)
+    return datafile_path
+
+
+def main():
+    """
+    Command line entry point
+
+    :return: Process exit code
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("template", help="Fleet template file")
+    parser.add_argument("--pod", type=int,
+                        help="Print the expanded datafile for this pod")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    start = time.perf_counter()
+    fleet = load_fleet(args.template)
+    logger.info("Loaded %d pods in %.1fms", len(fleet), (time.perf_counter() - start) * 1000)
+
+    if args.pod is not None:
+        yaml.safe_dump(fleet[args.pod], sys.stdout, sort_keys=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,353 @@
+"""
+Per-command latency instrumentation for the workshop triggers
+
+Developed for Cisco Live, DevNet Workshop DEVWKS-2539
+
+Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+instrument(uut) wraps the device's execute, configure, parse and learn
+methods; the device cache helpers record read-only API calls and cache
+hits. Every interaction is attributed to the device, trigger and test that
+made it and aggregated with:
+
+    calls      - number of calls
+    seconds    - wall time
+    exclusive  - wall time minus nested interactions, e.g. parse time
+                 without the execute round trip it triggered
+    bytes      - bytes received (execute) or sent (configure)
+    cache_hits - lookups served by the device cache
+
+The metrics are written once, when the Genie task ends, to the job's
+runinfo directory as device_metrics.json and device_metrics.prom
+(Prometheus text format), by the export_device_metrics cleanup subsection
+listed in subsection_datafile.yml.
+
+Since execute() is intercepted here, use_session() can also route one
+thread's execute() calls for a device through another connection, e.g. a
+connection pool, for concurrent collection. Likewise, add_configure_hook()
+registers callbacks that run after every configure() call, whichever
+trigger or Genie API made it.
+"""
+
+__author__ = "Palmer Sample"
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import contextlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+# pyATS import
+from pyats import aetest
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+METRIC_FIELDS = ("calls", "seconds", "exclusive", "bytes", "cache_hits")
+
+LABELS = ("device", "trigger", "test", "kind", "name")
+
+# Per-thread session routing set by use_session()
+_SESSION = threading.local()
+
+# Callbacks run after every configure() call, see add_configure_hook()
+_CONFIGURE_HOOKS = []
+
+
+def current_section():
+    """
+    Find the trigger section making the current device call by walking up
+    the stack to the first method of an object that looks like an aetest
+    section (has "uid" and "parameters").
+
+    :return: tuple of (trigger uid, test name)
+    """
+    frame = sys._getframe(2)  # pylint: disable=protected-access
+    while frame is not None:
+        owner = frame.f_locals.get("self")
+        if hasattr(owner, "uid") and hasattr(owner, "parameters"):
+            return str(owner.uid), frame.f_code.co_name
+        frame = frame.f_back
+    # Worker threads: use the section that started them, see use_session()
+    return getattr(_SESSION, "section", None) or ("-", "-")
+
+
+class Metrics:
+    """
+    Thread-safe aggregation of device interaction metrics.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._metrics = {}
+
+    def _add(self, labels, **values):
+        with self._lock:
+            metric = self._metrics.setdefault(labels, dict.fromkeys(METRIC_FIELDS, 0))
+            for field, value in values.items():
+                metric[field] += value
+
+    def call(self, device_name, kind, name, function, *args, **kwargs):
+        """
+        Call function(*args, **kwargs) and record its timing.
+
+        :param device_name: Name of the testbed device
+        :param kind: Interaction type, e.g. "execute" or "api"
+        :param name: Command or API name
+        :param function: Callable performing the interaction
+        :return: function's return value
+        """
+        labels = (device_name, *current_section(), kind, name)
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            result = function(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+
+        # configure() echoes the config; _wrap() records the bytes sent
+        size = len(result) if isinstance(result, str) and kind != "configure" else 0
+        self._add(labels, calls=1, seconds=elapsed, exclusive=elapsed - nested,
+                  bytes=size)
+        return result
+
+    def cache_hit(self, device_name, kind, name):
+        """
+        Record a lookup served by the device cache.
+
+        :param device_name: Name of the testbed device
+        :param kind: Interaction type
+        :param name: Command or API name
+        :return: None
+        """
+        self._add((device_name, *current_section(), kind, name), cache_hits=1)
+
+    def record_bytes(self, device_name, kind, name, size):
+        """
+        Add to the byte count of an interaction.
+
+        :return: None
+        """
+        self._add((device_name, *current_section(), kind, name), bytes=size)
+
+    def as_list(self):
+        """
+        Snapshot of the metrics as a list of dicts.
+
+        :return: list of dict
+        """
+        with self._lock:
+            return [{**dict(zip(LABELS, labels)),
+                     **{field: round(value, 6) if isinstance(value, float) else value
+                        for field, value in metric.items()}}
+                    for labels, metric in sorted(self._metrics.items())]
+
+    def clear(self):
+        """
+        Drop all recorded metrics.
+
+        :return: None
+        """
+        with self._lock:
+            self._metrics.clear()
+
+    def to_prometheus(self):
+        """
+        Render the metrics in Prometheus text exposition format.
+
+        :return: str
+        """
+        def escape(value):
+            return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        prometheus_metrics = {
+            "calls": ("calls_total",
+                      "Number of device interactions"),
+            "seconds": ("seconds_total",
+                        "Wall time spent in device interactions"),
+            "exclusive": ("exclusive_seconds_total",
+                          "Wall time excluding nested device interactions"),
+            "bytes": ("bytes_total",
+                      "Bytes transferred by device interactions"),
+            "cache_hits": ("cache_hits_total",
+                           "Device interactions served by the device cache"),
+        }
+        entries = self.as_list()
+        lines = []
+        for field in METRIC_FIELDS:
+            suffix, help_text = prometheus_metrics[field]
+            metric_name = f"pyats_trigger_device_{suffix}"
+            lines.append(f"# HELP {metric_name} {help_text}")
+            lines.append(f"# TYPE {metric_name} counter")
+            for entry in entries:
+                labels = ",".join(f'{label}="{escape(entry[label])}"' for label in LABELS)
+                lines.append(f"{metric_name}{{{labels}}} {entry[field]}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, directory=None):
+        """
+        Write device_metrics.json and device_metrics.prom with the
+        cumulative metrics.
+
+        :param directory: Output directory (default: the Easypy runinfo
+            directory, or the current directory outside of Easypy)
+        :return: None
+        """
+        if directory is None:
+            try:
+                from pyats.easypy import runtime  # pylint: disable=import-outside-toplevel
+                directory = runtime.directory
+            except (ImportError, AttributeError):
+                directory = None
+        directory = directory or os.getcwd()
+
+        with open(os.path.join(directory, "device_metrics.json"), "w",
+                  encoding="utf-8") as json_file:
+            json.dump(self.as_list(), json_file, indent=2)
+        with open(os.path.join(directory, "device_metrics.prom"), "w",
+                  encoding="utf-8") as prom_file:
+            prom_file.write(self.to_prometheus())
+
+        logger.info("Device metrics written to %s", directory)
+
+
+# Job-scoped metrics shared by every trigger
+METRICS = Metrics()
+
+
+@aetest.subsection
+def export_device_metrics(self):  # pylint: disable=unused-argument
+    """
+    Common cleanup subsection: export the metrics of every trigger once, at
+    the end of the Genie task (see subsection_datafile.yml). The triggers
+    run in the Easypy task process, so the job file itself never sees them.
+
+    :return: None
+    """
+    METRICS.export()
+
+
+def _original_method(device, method_name):
+    """
+    Resolve the device method bypassing the instance-level wrapper. pyATS
+    devices forward execute/configure to the current default connection, so
+    this is resolved on every call rather than once.
+    """
+    class_attribute = getattr(type(device), method_name, None)
+    if class_attribute is not None:
+        return class_attribute.__get__(device)
+    return type(device).__getattr__(device, method_name)
+
+
+@contextlib.contextmanager
+def use_session(device, connection, section=None):
+    """
+    Route the current thread's execute() calls for the device, including
+    those made by Genie parsers and APIs, through another connection.
+
+    :param device: Instrumented testbed device object
+    :param connection: Connection (or connection pool) to execute on
+    :param section: (trigger uid, test name) to attribute metrics to, as a
+        worker thread's stack does not include the trigger section
+    :return: Context manager
+    """
+    previous = _SESSION.__dict__.copy()
+    _SESSION.device, _SESSION.connection, _SESSION.section = device, connection, section
+    try:
+        yield connection
+    finally:
+        _SESSION.__dict__.clear()
+        _SESSION.__dict__.update(previous)
+
+
+def _session_method(device, method_name):
+    """
+    Return the use_session() override for the method, if any.
+    """
+    if method_name == "execute" and getattr(_SESSION, "device", None) is device:
+        return _SESSION.connection.execute
+    return None
+
+
+def add_configure_hook(hook):
+    """
+    Call hook(device) after every configure() call on an instrumented
+    device. Hooks also run when configure() raises, as the device may have
+    applied part of the configuration.
+
+    :param hook: Callable taking the testbed device object
+    :return: None
+    """
+    if hook not in _CONFIGURE_HOOKS:
+        _CONFIGURE_HOOKS.append(hook)
+
+
+def _first_argument(keyword):
+    """
+    Build a function returning the first positional argument, or the given
+    keyword argument, as the interaction name.
+    """
+    def name_from_args(*args, **kwargs):
+        return str(args[0] if args else kwargs.get(keyword, ""))
+    return name_from_args
+
+
+def _config_size(config):
+    return len(config) if isinstance(config, str) else sum(map(len, config))
+
+
+def _wrap(device, method_name, name_from_args):
+    def wrapper(*args, **kwargs):
+        name = name_from_args(*args, **kwargs)
+        if method_name == "configure" and args:
+            METRICS.record_bytes(device.name, method_name, name, _config_size(args[0]))
+        method = _session_method(device, method_name) \
+            or _original_method(device, method_name)
+        try:
+            return METRICS.call(device.name, method_name, name, method, *args, **kwargs)
+        finally:
+            if method_name == "configure":
+                for hook in _CONFIGURE_HOOKS:
+                    hook(device)
+
+    setattr(device, method_name, wrapper)
+
+
+def instrument(device):
+    """
+    Wrap a device's execute, configure, parse and learn methods to record
+    metrics. Safe to call repeatedly.
+
+    :param device: Testbed device object
+    :return: device
+    """
+    if getattr(device, "_metrics_instrumented", False):
+        return device
+
+    _wrap(device, "execute", _first_argument("command"))
+    _wrap(device, "configure", lambda *args, **kwargs: "configure")
+    _wrap(device, "parse", _first_argument("command"))
+    _wrap(device, "learn", _first_argument("feature"))
+
+    device._metrics_instrumented = True  # pylint: disable=protected-access
+    return device
@@ -23,17 +23,52 @@ __author__ = "Palmer Sample"
 __copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
 __license__ = "Cisco Sample Code License, Version 1.1"
 
+import argparse
 import os
 from genie.harness.main import gRun
 
-def main():
+from fleet_datafile import write_pod_datafile
+
+def main(runtime):
     """
     Required method to instantiate the Easypy runtime environment for the test
 
+    Custom job arguments:
+      --trigger-datafile: Trigger datafile to run, relative to this job
+        file (default: trigger_datafile.yml)
+      --fleet-template: Fleet template to expand for this pod
+        ($POD_NUMBER) instead of --trigger-datafile
+
+    The job runs against the testbed given to Easypy's own --testbed-file
+    option, e.g. the mock testbed written by "playback.py mock", and
+    against testbed.yml next to this file otherwise.
+
+    The device metrics of every trigger are exported once, at the end of
+    the Genie task, by the export_device_metrics cleanup subsection in
+    subsection_datafile.yml. gRun runs the triggers in a separate task
+    process, so they cannot be exported from here.
+
+    :param runtime: Easypy runtime object
     :return: None
     """
     test_path = os.path.dirname(os.path.abspath(__file__))
 
+    # Easypy leaves arguments it does not know about for the job file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trigger-datafile", default="trigger_datafile.yml")
+    parser.add_argument("--fleet-template")
+    args, _ = parser.parse_known_args()
+
+    trigger_datafile = os.path.join(test_path, args.trigger_datafile)
+    if args.fleet_template:
+        trigger_datafile = write_pod_datafile(os.path.join(test_path, args.fleet_template),
+                                              int(os.environ["POD_NUMBER"]),
+                                              runtime.directory)
+
+    testbed = getattr(runtime, "testbed", None)
+    if testbed is None:
+        testbed = f"{test_path}/testbed.yml"
+
     gRun(subsection_datafile=f"{test_path}/subsection_datafile.yml",
-         trigger_datafile=f"{test_path}/trigger_datafile.yml",
-         testbed=f"{test_path}/testbed.yml")
+         trigger_datafile=trigger_datafile,
+         testbed=testbed)
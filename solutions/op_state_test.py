@@ -32,21 +32,178 @@ import ipaddress
 from pyats import aetest
 from genie.harness.base import Trigger
 from genie.metaparser.util.exceptions import SchemaEmptyParserError, InvalidCommandError
-from unicon.core.errors import SubCommandFailure
+from unicon.core.errors import (SubCommandFailure,
+                                 ConnectionError as UniconConnectionError,
+                                 StateMachineError,
+                                 TimeoutError as UniconTimeoutError)
+
+from convergence import wait_for_ospf_convergence
+from device_cache import CACHE, cached_api, cached_parse
+from ospf_interface import interface_list, ospf_interface_index, prefix_list
+from route_lookup import DEFAULT_TARGETED_LIMIT, find_ospf_routes, targeted_lookup
+from session_pool import close_session_pool, collect_concurrently, open_session_pool
+from state_store import StateStore
+from verdict_store import device_key
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
 
+def ospf_neighbors(uut):
+    """
+    OSPF neighbors of the device, by interface.
+
+    :param uut: Testbed device object
+    :return: dict of interface -> dict of neighbor router-id -> state
+    """
+    try:
+        neighbors = cached_parse(uut, "show ip ospf neighbor")
+    except SchemaEmptyParserError:
+        return {}
+    return {interface: {router_id: neighbor.get("state")
+                        for router_id, neighbor in details.get("neighbors", {}).items()}
+            for interface, details in neighbors.get("interfaces", {}).items()}
+
+
+def collect_op_state(uut,
+                     ospf_process_id,
+                     expected_routes,
+                     sessions,
+                     ospf_interface_parser="genie",
+                     route_longest_match=False,
+                     route_targeted_limit=DEFAULT_TARGETED_LIMIT):
+    """
+    Run the op state queries of every test at the same time, over a pool
+    of CLI sessions to the device. The results land in the device cache,
+    so the tests then assert against collected data. A query that fails
+    here is simply repeated (and reported) by its test, and if the pool
+    cannot be opened the tests query the device sequentially.
+
+    :param uut: Testbed device object
+    :param ospf_process_id: Desired OSPF process ID
+    :param expected_routes: list of expected prefixes
+    :param sessions: Number of concurrent CLI sessions
+    :param ospf_interface_parser: "genie", "fast" or "verify"
+    :param route_longest_match: See test_hub_loopback_route_is_present
+    :param route_targeted_limit: See test_hub_loopback_route_is_present
+    :return: None
+    """
+    queries = {
+        "router-id": lambda: cached_api(uut,
+                                        "get_ospf_router_id",
+                                        instance=str(ospf_process_id)),
+        "ospf interfaces": lambda: ospf_interface_index(uut, parser=ospf_interface_parser),
+    }
+    if len(expected_routes) > route_targeted_limit:
+        queries["ospf routes"] = lambda: find_ospf_routes(uut,
+                                                          expected_routes,
+                                                          longest_match=route_longest_match,
+                                                          targeted_limit=route_targeted_limit)
+    else:
+        for prefix in expected_routes:
+            queries[f"route {prefix}"] = \
+                lambda prefix=prefix: targeted_lookup(uut, prefix,
+                                                      longest_match=route_longest_match)
+
+    try:
+        pool = open_session_pool(uut, sessions)
+    except (UniconConnectionError,
+            UniconTimeoutError,
+            StateMachineError) as err:
+        logger.warning("Could not open CLI sessions, collecting sequentially: %s", err)
+        return
+
+    errors = collect_concurrently(uut, pool, queries)
+    for name, err in errors.items():
+        logger.info("Query '%s' failed during collection, the test will retry it: %s",
+                    name, err)
+    logger.info("Collected %d op state queries over %d sessions",
+                len(queries) - len(errors), sessions)
+
+
 class TestOspfOpState(Trigger):
     """
     OSPF operational state trigger
     """
+    @aetest.setup
+    def prepare_test(self,
+                     uut,
+                     ospf_process_id,
+                     tunnel_interface,
+                     hub_loopback_ip,
+                     ospf_interface_parser="genie",
+                     route_longest_match=False,
+                     route_targeted_limit=DEFAULT_TARGETED_LIMIT,
+                     convergence_timeout=0,
+                     convergence_interval=1,
+                     convergence_max_interval=10,
+                     op_state_sessions=0):
+        """
+        Perform setup tasks for this testscript. Both are optional and the
+        tests run in every case.
+
+        Tasks performed:
+          - Wait for OSPF to converge, e.g. right after ConfigureSpokeOspf.
+            Polls cheap signals - the OSPF adjacency on the tunnel
+            interface, then a single route lookup for the hub loopback -
+            with exponential backoff, until they succeed or the deadline
+            passes.
+          - Run the op state queries of every test at the same time, over a
+            pool of CLI sessions (see collect_op_state()).
+          - Set a parameter named "ospf_facts", where the tests record what
+            they retrieved for the state store
+
+        :param uut: Testbed device object for this trigger
+        :param ospf_process_id: Desired OSPF process ID (from datafile)
+        :param tunnel_interface: Tunnel interface (or list of interfaces) to
+            check (from datafile)
+        :param hub_loopback_ip: Expected hub Loopback IP address (or list of
+            prefixes) (from datafile)
+        :param ospf_interface_parser: "genie", "fast" or "verify" (from
+            datafile, default "genie")
+        :param route_longest_match: See test_hub_loopback_route_is_present
+        :param route_targeted_limit: See test_hub_loopback_route_is_present
+        :param convergence_timeout: Deadline in seconds; 0 disables the wait
+            (from datafile, default 0)
+        :param convergence_interval: Initial polling interval in seconds
+        :param convergence_max_interval: Maximum polling interval in seconds
+        :param op_state_sessions: Number of concurrent CLI sessions; 0
+            disables concurrent collection (from datafile, default 0)
+        :return: None
+        """
+        self.parameters.update(ospf_facts={})
+
+        expected_routes = prefix_list(hub_loopback_ip)
+
+        if convergence_timeout and not expected_routes:
+            logger.warning("No hub_loopback_ip prefix to wait for, skipping the "
+                           "OSPF convergence wait")
+        elif convergence_timeout:
+            converged = wait_for_ospf_convergence(uut,
+                                                  interface_list(tunnel_interface),
+                                                  expected_routes[0],
+                                                  convergence_timeout,
+                                                  interval=convergence_interval,
+                                                  max_interval=convergence_max_interval)
+            if not converged:
+                logger.warning("OSPF did not converge within %ss, running the tests anyway",
+                               convergence_timeout)
+
+        if op_state_sessions:
+            collect_op_state(uut,
+                             ospf_process_id,
+                             expected_routes,
+                             op_state_sessions,
+                             ospf_interface_parser=ospf_interface_parser,
+                             route_longest_match=route_longest_match,
+                             route_targeted_limit=route_targeted_limit)
+
     @aetest.test
     def test_ospf_router_id(self,
                             uut,
                             ospf_process_id,
-                            ospf_router_id):
+                            ospf_router_id,
+                            ospf_facts=None):
         """
         Use a Genie API to obtain the OSPF process router-id and test that
         it matches the desired state from the trigger datafile.
@@ -54,6 +211,7 @@ class TestOspfOpState(Trigger):
         :param uut: Testbed device object for this trigger
         :param ospf_process_id: Desired OSPF process ID (from datafile)
         :param ospf_router_id: Desired OSPF router ID (from datafile)
+        :param ospf_facts: Retrieved facts, set by prepare_test
         :return: None
         """
 
@@ -62,47 +220,83 @@ class TestOspfOpState(Trigger):
                     ospf_router_id)
 
         # "instance" argument is expected to be a string
-        ops_router_id = uut.api.get_ospf_router_id(instance=str(ospf_process_id))
+        ops_router_id = cached_api(uut,
+                                   "get_ospf_router_id",
+                                   instance=str(ospf_process_id))
+        if ospf_facts is not None:
+            ospf_facts["router_id"] = ops_router_id
 
         assert ospf_router_id == ops_router_id, \
             f"Expected: {ospf_router_id} - actual is: {ops_router_id}"
 
     @aetest.test
-    def test_tunnel_ospf_area(self, uut, ospf_process_id, tunnel_interface, tunnel_ospf_area):
+    def test_tunnel_ospf_area(self,
+                              uut,
+                              steps,
+                              ospf_process_id,
+                              tunnel_interface,
+                              tunnel_ospf_area,
+                              ospf_interface_parser="genie",
+                              ospf_facts=None):
         """
 
         :param uut: Testbed device object for this trigger
+        :param steps: aetest built-in "steps" class to group test results.
         :param ospf_process_id: Desired OSPF process ID (from datafile)
-        :param tunnel_interface: Tunnel interface to configure (from datafile)
+        :param tunnel_interface: Tunnel interface (or list of interfaces) to
+            check (from datafile)
         :param tunnel_ospf_area: Desired tunnel OSPF area (from datafile)
+        :param ospf_interface_parser: "genie", "fast" or "verify" (from
+            datafile, default "genie"). See ospf_interface.py.
+        :param ospf_facts: Retrieved facts, set by prepare_test
         :return: None
         """
-
-        logger.info("Testing interface '%s' is in OSPF area '%s'",
-                    tunnel_interface,
-                    tunnel_ospf_area)
-
-        desired_ospf_area = str(ipaddress.IPv4Address(tunnel_ospf_area))
+        interfaces = interface_list(tunnel_interface)
         try:
-            ops_ospf_area = uut.api.get_ospf_area_of_interface(interface=tunnel_interface,
-                                                               process_id=str(ospf_process_id))
+            index = ospf_interface_index(uut, parser=ospf_interface_parser)
         except (SubCommandFailure,
-                InvalidCommandError,
-                IndexError) as err:
-            self.failed(f"Could not get OSPF area for interface '{tunnel_interface}': {err}")
+                SchemaEmptyParserError,
+                InvalidCommandError) as err:
+            self.failed(f"Could not parse OSPF interface data: {err}")
+        if ospf_facts is not None:
+            ospf_facts["interfaces"] = index
+
+        desired_ospf_area = str(ipaddress.IPv4Address(tunnel_ospf_area))
+
+        logger.info("Testing %d interface(s) are in OSPF area '%s'",
+                    len(interfaces),
+                    desired_ospf_area)
 
-        assert desired_ospf_area == ops_ospf_area, \
-            f"Expected: {desired_ospf_area} - actual is: {ops_ospf_area}"
+        for interface in interfaces:
+            with steps.start(f"{interface} OSPF area", continue_=True):
+                ops_interface = index.get(interface)
+                assert ops_interface is not None \
+                    and ops_interface["process_id"] == str(ospf_process_id), \
+                    f"Interface '{interface}' is not in OSPF process {ospf_process_id}"
+
+                ops_ospf_area = ops_interface["area"]
+                assert desired_ospf_area == ops_ospf_area, \
+                    f"Expected: {desired_ospf_area} - actual is: {ops_ospf_area}"
 
     @aetest.test
-    def test_tunnel_interface_state(self, uut, steps, tunnel_interface, tunnel_interface_enabled):
+    def test_tunnel_interface_state(self,
+                                    uut,
+                                    steps,
+                                    tunnel_interface,
+                                    tunnel_interface_enabled,
+                                    ospf_interface_parser="genie",
+                                    ospf_facts=None):
         """
 
         :param uut: Testbed device object for this trigger
         :param steps: aetest built-in "steps" class to group test results.
-        :param tunnel_interface: Tunnel interface to configure (from datafile)
+        :param tunnel_interface: Tunnel interface (or list of interfaces) to
+            check (from datafile)
         :param tunnel_interface_enabled: Datafile parameter for Tunnel to match
             the op state (True = "up/up", False = "?/down")
+        :param ospf_interface_parser: "genie", "fast" or "verify" (from
+            datafile, default "genie"). See ospf_interface.py.
+        :param ospf_facts: Retrieved facts, set by prepare_test
         :return: None
         """
 
@@ -110,43 +304,124 @@ class TestOspfOpState(Trigger):
         # but the parser needs to be updated to match Tunnel* in the regex.
         # Added to personal TODO -LPS
 
+        interfaces = interface_list(tunnel_interface)
         try:
-            interface_op_state = uut.parse(f"show ip ospf interface {tunnel_interface}")
+            index = ospf_interface_index(uut, parser=ospf_interface_parser)
         except (SubCommandFailure,
                 SchemaEmptyParserError,
                 InvalidCommandError) as err:
-            self.failed(f"Could not parse OSPF data for interface '{tunnel_interface}': {err}")
-
-        logger.info("Interface op state:\n%s", json.dumps(interface_op_state, indent=2))
-
-        with steps.start("enabled", continue_=True):
-            assert interface_op_state.q.contains_key_value("enable",
-                                                           tunnel_interface_enabled), \
-                "Interface is shutdown"
-
-        with steps.start("line protocol", continue_=True):
-            assert interface_op_state.q.contains_key_value("line_protocol",
-                                                           tunnel_interface_enabled), \
-                "Interface line protocol mismatch"
-
-        with steps.start("passive"):
-            assert interface_op_state.q.contains_key_value("passive", False), \
-                "Interface is passive"
+            self.failed(f"Could not parse OSPF interface data: {err}")
+        if ospf_facts is not None:
+            ospf_facts["interfaces"] = index
+            ospf_facts["tested_interfaces"] = dict.fromkeys(interfaces,
+                                                            tunnel_interface_enabled)
+
+        logger.info("Interface op state:\n%s",
+                    json.dumps({interface: index.get(interface) for interface in interfaces},
+                               indent=2))
+
+        for interface in interfaces:
+            with steps.start(interface, continue_=True) as interface_step:
+                interface_op_state = index.get(interface)
+                assert interface_op_state is not None, \
+                    f"No OSPF data for interface '{interface}'"
+
+                with interface_step.start("enabled", continue_=True):
+                    assert interface_op_state["enable"] == tunnel_interface_enabled, \
+                        "Interface is shutdown"
+
+                with interface_step.start("line protocol", continue_=True):
+                    assert interface_op_state["line_protocol"] == tunnel_interface_enabled, \
+                        "Interface line protocol mismatch"
+
+                with interface_step.start("passive", continue_=True):
+                    assert interface_op_state["passive"] is False, \
+                        "Interface is passive"
 
     @aetest.test
-    def test_hub_loopback_route_is_present(self, uut, hub_loopback_ip):
+    def test_hub_loopback_route_is_present(self,
+                                           uut,
+                                           hub_loopback_ip,
+                                           route_longest_match=False,
+                                           route_targeted_limit=DEFAULT_TARGETED_LIMIT,
+                                           ospf_facts=None):
         """
+        Test that the expected prefixes are present in the OSPF routes. Up to
+        route_targeted_limit prefixes are checked with one targeted route
+        query each; larger lists are resolved against a single, indexed
+        fetch of the OSPF RIB.
 
         :param uut: Testbed device object for this trigger
-        :param hub_loopback_ip: Expected hub Loopback IP address to be present
-            in the global RIB
+        :param hub_loopback_ip: Expected hub Loopback IP address (or list of
+            prefixes) to be present in the global RIB
+        :param route_longest_match: Accept the most specific covering OSPF
+            route instead of an exact prefix match (from datafile, default
+            False)
+        :param route_targeted_limit: Largest prefix list checked with
+            targeted queries (from datafile)
+        :param ospf_facts: Retrieved facts, set by prepare_test
         :return: None
         """
-        logger.info("Testing hub loopback IP '%s' is present in the routing table",
-                    hub_loopback_ip)
-
-        ospf_routes = uut.api.get_routing_ospf_routes()
-        logger.info("OSPF routes present:\n%s", json.dumps(ospf_routes, indent=2))
+        expected_routes = prefix_list(hub_loopback_ip)
+        if not expected_routes:
+            self.failed("hub_loopback_ip in the datafile does not list any "
+                        "expected prefix")
+
+        logger.info("Testing %d expected prefix(es) are present in the routing table",
+                    len(expected_routes))
+
+        matched_routes = find_ospf_routes(uut,
+                                          expected_routes,
+                                          longest_match=route_longest_match,
+                                          targeted_limit=route_targeted_limit)
+        if ospf_facts is not None:
+            ospf_facts["routes"] = matched_routes
+        logger.info("Matched OSPF routes:\n%s",
+                    json.dumps({prefix: match for prefix, match in matched_routes.items()
+                                if match is not None}, indent=2))
+
+        missing_routes = [prefix for prefix, match in matched_routes.items()
+                          if match is None]
+        assert not missing_routes, \
+            f"Expected route(s) {missing_routes} not present in the spoke RIB."
+
+    @aetest.cleanup
+    def test_cleanup(self,
+                     uut,
+                     op_state_sessions=0,
+                     ospf_facts=None,
+                     state_store=None):
+        """
+        Close the concurrent collection sessions, if any, and write the OSPF
+        facts the tests retrieved to the state store, if configured. Then
+        report the device cache counters once the op state tests complete.
 
-        assert hub_loopback_ip in ospf_routes, \
-            f"Expected route '{hub_loopback_ip}' not present in the spoke RIB."
+        :param uut: Testbed device object for this trigger
+        :param op_state_sessions: Number of concurrent CLI sessions (from
+            datafile, default 0)
+        :param ospf_facts: Retrieved facts, set by prepare_test
+        :param state_store: State store directory (from datafile, default
+            None). See state_store.py.
+        :return: None
+        """
+        if state_store and ospf_facts is not None:
+            facts = dict(ospf_facts)
+            # No test reads the neighbors: fetch them here, without letting a
+            # device failure error the cleanup
+            try:
+                facts["neighbors"] = ospf_neighbors(uut)
+            except (SubCommandFailure,
+                    InvalidCommandError,
+                    UniconConnectionError,
+                    UniconTimeoutError,
+                    StateMachineError) as err:
+                logger.warning("Could not record OSPF neighbors: %s", err)
+
+            writer = StateStore(state_store).writer(device_key(uut))
+            for name, value in facts.items():
+                writer.add(("ospf", name), value)
+            writer.write()
+
+        if op_state_sessions:
+            close_session_pool(uut)
+        CACHE.log_stats()
@@ -0,0 +1,212 @@
+"""
+OSPF interface state from "show ip ospf interface", with a fast-path parser
+
+Developed for Cisco Live, DevNet Workshop DEVWKS-2539
+
+Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+The triggers check four fields per interface: the OSPF area and the
+"enable", "line_protocol" and "passive" flags. One unfiltered
+"show ip ospf interface" per device is indexed by interface name, so the
+number of round trips does not grow with the number of interfaces
+checked.
+
+The Genie parser builds the full schema, which is a measurable CPU cost
+with many devices reporting at once. The fast-path parser extracts just
+the checked fields with a few regular expressions.
+
+Both parsers report the flags as bools. As in the Genie schema, an
+interface is only considered not passive when it is sending hellos
+("Hello due in ..."); otherwise "passive" is True.
+
+Parser selection ("ospf_interface_parser" trigger parameter):
+
+    genie  - full Genie parser (default)
+    fast   - fast-path parser only
+    verify - run both, warn and use the Genie result if they disagree
+"""
+
+__author__ = "Palmer Sample"
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import ipaddress
+import logging
+import re
+
+from device_cache import CACHE, PARSE_CACHE, cached_execute, cached_parse
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+SHOW_IP_OSPF_INTERFACE = "show ip ospf interface"
+
+INTERFACE_FIELDS = ("process_id", "area", "enable", "line_protocol", "passive")
+
+PARSERS = ("genie", "fast", "verify")
+
+# Tunnel1 is up, line protocol is up
+# GigabitEthernet2 is administratively down, line protocol is down (disabled)
+INTERFACE_HEADER = re.compile(r"^(?P<interface>\S+) +is( +administratively)?"
+                              r" +(?P<enable>unknown|up|down), +line +protocol"
+                              r" +is +(?P<line_protocol>up|down)")
+
+#   Internet Address 10.255.0.2/24, Interface ID 13, Area 0
+#   Interface is unnumbered. Using address of Loopback0 (10.0.0.1), Area 1
+AREA = re.compile(r", +Area +(?P<area>[\d.]+)")
+
+#   Process ID 4, Router ID 0.0.0.2, Network Type POINT_TO_POINT, Cost: 1000
+PROCESS_ID = re.compile(r"^ +Process +ID +(?P<process_id>\d+),")
+
+#     Hello due in 00:00:05
+HELLO_DUE = re.compile(r"^ +Hello +due +in +\S+")
+
+#   No Hellos (Passive interface)
+PASSIVE = re.compile(r"^ +No +Hellos +\(Passive +interface\)")
+
+
+def interface_list(interfaces):
+    """
+    Accept a single interface name or a list of names from the datafile.
+
+    :param interfaces: str or list of str
+    :return: list of str
+    """
+    if isinstance(interfaces, str):
+        return [interfaces]
+    return list(interfaces)
+
+
+def prefix_list(prefixes):
+    """
+    Accept a single prefix or a list of prefixes from the datafile.
+
+    :param prefixes: str, list of str or None
+    :return: list of str (empty if no prefix was given)
+    """
+    if not prefixes:
+        return []
+    if isinstance(prefixes, str):
+        return [prefixes]
+    return list(prefixes)
+
+
+def dotted_area(area):
+    """
+    Normalize an OSPF area to dotted-decimal, as Genie reports it.
+
+    :param area: Area ID, e.g. "0" or "0.0.0.0"
+    :return: str
+    """
+    return area if "." in area else str(ipaddress.IPv4Address(int(area)))
+
+
+def parse_ospf_interfaces(output):
+    """
+    Fast-path parser: extract the checked fields for every interface.
+
+    :param output: Raw "show ip ospf interface" output
+    :return: dict of interface name -> dict of INTERFACE_FIELDS
+    """
+    interfaces = {}
+    fields = None
+    for line in output.splitlines():
+        match = INTERFACE_HEADER.match(line)
+        if match:
+            fields = interfaces[match.group("interface")] = {
+                "process_id": None,
+                "area": None,
+                "enable": match.group("enable") == "up",
+                "line_protocol": match.group("line_protocol") == "up",
+                "passive": True,
+            }
+            continue
+        if fields is None:
+            continue
+
+        if fields["area"] is None and (match := AREA.search(line)):
+            fields["area"] = dotted_area(match.group("area"))
+        elif fields["process_id"] is None and (match := PROCESS_ID.match(line)):
+            fields["process_id"] = match.group("process_id")
+        elif HELLO_DUE.match(line):
+            fields["passive"] = False
+        elif PASSIVE.match(line):
+            fields["passive"] = True
+    return interfaces
+
+
+def genie_ospf_interfaces(parsed):
+    """
+    Extract the checked fields for every interface from the Genie
+    "show ip ospf interface" schema.
+
+    :param parsed: Genie parser output
+    :return: dict of interface name -> dict of INTERFACE_FIELDS
+    """
+    interfaces = {}
+    for vrf in parsed.get("vrf", {}).values():
+        for address_family in vrf.get("address_family", {}).values():
+            for process_id, instance in address_family.get("instance", {}).items():
+                for area_id, area in instance.get("areas", {}).items():
+                    for name, interface in area.get("interfaces", {}).items():
+                        interfaces[name] = {
+                            "process_id": str(process_id),
+                            "area": area_id,
+                            "enable": bool(interface.get("enable")),
+                            "line_protocol": bool(interface.get("line_protocol")),
+                            # Genie only sets "passive" (to False) for
+                            # interfaces with a hello timer
+                            "passive": interface.get("passive") is not False,
+                        }
+    return interfaces
+
+
+def ospf_interface_index(uut, parser="genie", ttl=None):
+    """
+    Retrieve "show ip ospf interface" once and index it by interface name
+    using the selected parser. Results are cached per device and per raw
+    output.
+
+    :param uut: Testbed device object
+    :param parser: One of PARSERS
+    :param ttl: Optional TTL override in seconds
+    :return: dict of interface name -> dict of INTERFACE_FIELDS
+    """
+    if parser not in PARSERS:
+        raise ValueError(f"Unknown OSPF interface parser '{parser}', "
+                         f"expected one of {', '.join(PARSERS)}")
+
+    if parser == "genie":
+        return genie_ospf_interfaces(cached_parse(uut, SHOW_IP_OSPF_INTERFACE, ttl=ttl))
+
+    def fetch():
+        output = cached_execute(uut, SHOW_IP_OSPF_INTERFACE, ttl=ttl)
+        return PARSE_CACHE.get_or_parse(("fast", SHOW_IP_OSPF_INTERFACE),
+                                        output,
+                                        lambda: parse_ospf_interfaces(output))
+
+    fast_index = CACHE.get_or_fetch(uut.name,
+                                    ("fast_parse", SHOW_IP_OSPF_INTERFACE),
+                                    fetch,
+                                    ttl=ttl)
+    if parser == "fast":
+        return fast_index
+
+    genie_index = genie_ospf_interfaces(cached_parse(uut, SHOW_IP_OSPF_INTERFACE, ttl=ttl))
+    if fast_index != genie_index:
+        logger.warning("Fast-path parser disagrees with Genie on %s:\n"
+                       "fast:  %s\ngenie: %s",
+                       uut.name, fast_index, genie_index)
+    return genie_index
@@ -0,0 +1,197 @@
+"""
+Record and replay device sessions for offline trigger runs
+
+Developed for Cisco Live, DevNet Workshop DEVWKS-2539
+
+Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+Wraps the unicon playback feature:
+
+    # Run the job against the real devices and capture every command/output
+    # exchanged by the triggers into a compressed archive
+    python playback.py record sessions.tar.gz
+
+    # Run the job again from the archive, without any network access
+    python playback.py replay sessions.tar.gz
+
+    # Build mock_device_cli data and a testbed that uses it, for interactive
+    # use or for jobs that send commands in a different order
+    python playback.py mock sessions.tar.gz --output-dir mock
+
+    # Run the job offline against the mock testbed
+    pyats run job job.py --no-mail --testbed-file mock/testbed.yml
+
+Any extra arguments are passed to "pyats run job", e.g. the trigger datafile
+to record with --trigger-datafile spoke_trigger_data.yml.
+"""
+
+__author__ = "Palmer Sample"
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+import yaml
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+TEST_PATH = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_job(job_file, *args):
+    """
+    Run an Easypy job from the solutions directory.
+
+    :param job_file: Path to the Easypy job file
+    :param args: Additional arguments for "pyats run job"
+    :return: Process exit code
+    """
+    command = ["pyats", "run", "job", job_file, "--no-mail", *args]
+    logger.info("Running: %s", " ".join(command))
+    return subprocess.run(command, cwd=TEST_PATH, check=False).returncode
+
+
+def record(archive, job_file, extra_args):
+    """
+    Run the job with unicon recording enabled and store the recording as a
+    compressed archive.
+
+    :param archive: Path of the .tar.gz archive to create
+    :param job_file: Path to the Easypy job file
+    :param extra_args: Additional arguments for "pyats run job"
+    :return: Process exit code
+    """
+    with tempfile.TemporaryDirectory() as record_dir:
+        returncode = run_job(job_file, "--record", record_dir, *extra_args)
+        with tarfile.open(archive, "w:gz") as archive_file:
+            archive_file.add(record_dir, arcname=".")
+
+    logger.info("Recorded sessions saved to %s (%d bytes)",
+                archive, os.path.getsize(archive))
+    return returncode
+
+
+def extract(archive, directory):
+    """
+    Extract a recording archive.
+
+    :param archive: Path of the .tar.gz archive
+    :param directory: Destination directory
+    :return: directory
+    """
+    with tarfile.open(archive, "r:gz") as archive_file:
+        archive_file.extractall(directory, filter="data")
+    return directory
+
+
+def replay(archive, job_file, extra_args):
+    """
+    Run the job with unicon serving every device interaction from the
+    recording. No connection to the devices is made.
+
+    :param archive: Path of the .tar.gz archive
+    :param job_file: Path to the Easypy job file
+    :param extra_args: Additional arguments for "pyats run job"
+    :return: Process exit code
+    """
+    with tempfile.TemporaryDirectory() as record_dir:
+        extract(archive, record_dir)
+        return run_job(job_file, "--replay", record_dir, *extra_args)
+
+
+def mock(archive, output_dir, testbed_file):
+    """
+    Convert a recording into mock_device_cli data, and write a copy of the
+    testbed whose devices connect to the mock devices instead.
+
+    :param archive: Path of the .tar.gz archive
+    :param output_dir: Directory for the mock data and testbed
+    :param testbed_file: Testbed to base the mock testbed on
+    :return: Process exit code
+    """
+    with open(testbed_file, encoding="utf-8") as testbed_yaml:
+        testbed = yaml.safe_load(testbed_yaml)
+
+    with tempfile.TemporaryDirectory() as record_dir:
+        extract(archive, record_dir)
+        for device_name, device in testbed["devices"].items():
+            recording = os.path.join(record_dir, device_name)
+            if not os.path.exists(recording):
+                logger.warning("No recording for '%s', skipping", device_name)
+                continue
+
+            mock_dir = os.path.abspath(os.path.join(output_dir, device_name))
+            os.makedirs(mock_dir, exist_ok=True)
+            subprocess.run([sys.executable, "-m", "unicon.playback.mock",
+                            "--recorded-data", recording,
+                            "--output", os.path.join(mock_dir, "mock_device.yaml")],
+                           check=True)
+
+            device["connections"] = {
+                "cli": {
+                    "command": f"mock_device_cli --os {device['os']} "
+                               f"--mock_data_dir {mock_dir} --state connect",
+                },
+            }
+
+    mock_testbed = os.path.join(output_dir, "testbed.yml")
+    with open(mock_testbed, "w", encoding="utf-8") as testbed_yaml:
+        yaml.safe_dump(testbed, testbed_yaml, sort_keys=False)
+
+    logger.info("Mock testbed written to %s. Run the job offline with:\n"
+                "  pyats run job %s --no-mail --testbed-file %s",
+                mock_testbed,
+                os.path.join(TEST_PATH, "job.py"),
+                os.path.abspath(mock_testbed))
+    return 0
+
+
+def main():
+    """
+    Command line entry point
+
+    :return: Process exit code
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("action", choices=("record", "replay", "mock"))
+    parser.add_argument("archive", help="Recording archive (.tar.gz)")
+    parser.add_argument("--job", default=os.path.join(TEST_PATH, "job.py"),
+                        help="Easypy job file")
+    parser.add_argument("--testbed-file", default=os.path.join(TEST_PATH, "testbed.yml"),
+                        help="Testbed used to build the mock testbed")
+    parser.add_argument("--output-dir", default="mock",
+                        help="Output directory for the mock action")
+    args, extra_args = parser.parse_known_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    archive = os.path.abspath(args.archive)
+    job_file = os.path.abspath(args.job)
+    if args.action == "record":
+        return record(archive, job_file, extra_args)
+    if args.action == "replay":
+        return replay(archive, job_file, extra_args)
+    return mock(archive, args.output_dir, args.testbed_file)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
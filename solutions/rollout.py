@@ -0,0 +1,241 @@
+"""
+Wave-based rollout of ConfigureSpokeOspf across the fleet
+
+Developed for Cisco Live, DevNet Workshop DEVWKS-2539
+
+Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+The pods are split into waves: a canary, then waves growing by --growth up
+to --max-wave pods (or explicit --waves sizes). For every wave the
+configuration job (spoke_trigger_data.yml) runs on each pod, then the
+verification job (rollout_gate_data.yml, TestOspfOpState) runs on the pods
+whose configuration succeeded. The next wave only starts if no more than
+--max-failures pods of the wave failed either job; otherwise the rollout
+halts and the remaining pods are left untouched. Pods are rolled out in
+the order given to --pods.
+
+Both jobs run through fleet.run_fleet(), with at most --concurrency pyATS
+processes at once and at most --rate job starts per second.
+
+Example:
+    python rollout.py --pods 1-250 --canary 1 --growth 4 --max-wave 64 \\
+        --concurrency 16 --rate 2 --report rollout.json
+"""
+
+__author__ = "Palmer Sample"
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+from fleet import TEST_PATH, parse_pods, run_fleet
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def plan_waves(pods, canary=1, growth=2, max_wave=50, sizes=()):
+    """
+    Split the pods into rollout waves.
+
+    :param pods: list of pod numbers, in rollout order
+    :param canary: Size of the first wave
+    :param growth: Factor applied to the wave size after each wave
+    :param max_wave: Largest wave size
+    :param sizes: Explicit wave sizes; the last size repeats. Overrides
+        canary/growth/max_wave.
+    :return: list of lists of pod numbers
+    """
+    waves = []
+    index = 0
+    size = sizes[0] if sizes else canary
+    while index < len(pods):
+        waves.append(pods[index:index + size])
+        index += size
+        if sizes:
+            size = sizes[min(len(waves), len(sizes) - 1)]
+        else:
+            size = min(max(int(size * growth), size + 1), max_wave)
+    return waves
+
+
+def run_phase(wave, phase, datafile, concurrency, rate, output_dir, extra_args, **kwargs):
+    """
+    Run one job (configure or verify) on every pod of a wave.
+
+    :param wave: list of pod numbers
+    :param phase: Phase name, used for the archive directory
+    :param datafile: Trigger datafile for the job
+    :param concurrency: Maximum number of concurrent pyATS processes
+    :param rate: Maximum job starts per second
+    :param output_dir: Base directory for the wave's archives
+    :param extra_args: Additional arguments passed to "pyats run job"
+    :param kwargs: Keyword arguments passed to run_fleet()
+    :return: Fleet report
+    """
+    return run_fleet(wave,
+                     concurrency=min(concurrency, len(wave)),
+                     rate=rate,
+                     output_dir=os.path.join(output_dir, phase),
+                     extra_args=["--trigger-datafile", datafile, *extra_args],
+                     **kwargs)
+
+
+def run_rollout(waves, configure_datafile, verify_datafile, max_failures=0,
+                output_dir="rollout_runs", **kwargs):
+    """
+    Roll the configuration out wave by wave, gating every wave on the
+    verification of the previous one.
+
+    :param waves: list of lists of pod numbers (see plan_waves())
+    :param configure_datafile: Trigger datafile applying the configuration
+    :param verify_datafile: Trigger datafile verifying the result
+    :param max_failures: Failed pods tolerated per wave before halting
+    :param output_dir: Base directory for per-wave archives
+    :param kwargs: Keyword arguments passed to run_phase()
+    :return: Rollout report
+    """
+    start = time.monotonic()
+    wave_reports = []
+    halted = False
+    for number, wave in enumerate(waves, start=1):
+        wave_dir = os.path.join(output_dir, f"wave{number:02d}")
+        logger.info("Wave %d/%d: %d pod(s)", number, len(waves), len(wave))
+
+        wave_start = time.monotonic()
+        configured = run_phase(wave, "configure", configure_datafile,
+                               output_dir=wave_dir, **kwargs)
+        # Only verify pods whose configuration was applied
+        to_verify = [result["pod"] for result in configured["results"]
+                     if result["result"] == "passed"]
+        verify_failed = []
+        if to_verify:
+            verified = run_phase(to_verify, "verify", verify_datafile,
+                                 output_dir=wave_dir, **kwargs)
+            verify_failed = verified["devices_failed"]
+        failed = sorted(set(configured["devices_failed"]) | set(verify_failed))
+
+        wave_reports.append({
+            "wave": number,
+            "pods": wave,
+            "duration": round(time.monotonic() - wave_start, 3),
+            "configure_failed": configured["devices_failed"],
+            "verify_failed": verify_failed,
+            "verify_skipped": [pod for pod in wave if pod not in to_verify],
+        })
+        logger.info("Wave %d: %d/%d pod(s) passed in %.1fs",
+                    number, len(wave) - len(failed), len(wave),
+                    wave_reports[-1]["duration"])
+
+        if len(failed) > max_failures:
+            logger.error("Wave %d failed on %d pod(s) (%s), halting the rollout",
+                         number, len(failed), ", ".join(failed))
+            halted = True
+            break
+
+    completed = [pod for wave_report in wave_reports for pod in wave_report["pods"]]
+    return {
+        "status": "halted" if halted else "completed",
+        "waves_planned": len(waves),
+        "waves_run": len(wave_reports),
+        "pods_not_started": [pod for wave in waves for pod in wave if pod not in completed],
+        "wall_time": round(time.monotonic() - start, 3),
+        "waves": wave_reports,
+    }
+
+
+def main():
+    """
+    Command line entry point
+
+    :return: Process exit code
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--pods", required=True,
+                        help='Pods to configure, in rollout order, e.g. "1-100,120"')
+    parser.add_argument("--canary", type=int, default=1,
+                        help="Size of the first wave")
+    parser.add_argument("--growth", type=float, default=2,
+                        help="Wave size multiplier after each wave")
+    parser.add_argument("--max-wave", type=int, default=50,
+                        help="Largest wave size")
+    parser.add_argument("--waves",
+                        help='Explicit wave sizes, e.g. "1,5,25,100" (last size repeats)')
+    parser.add_argument("--max-failures", type=int, default=0,
+                        help="Failed pods tolerated per wave before halting")
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="Maximum number of concurrent pyATS jobs")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="Maximum pod jobs started per second (default: no limit)")
+    parser.add_argument("--configure-datafile", default="spoke_trigger_data.yml",
+                        help="Trigger datafile applying the configuration")
+    parser.add_argument("--verify-datafile", default="rollout_gate_data.yml",
+                        help="Trigger datafile gating each wave")
+    parser.add_argument("--job", default=os.path.join(TEST_PATH, "job.py"),
+                        help="Easypy job file")
+    parser.add_argument("--dns-domain", default=os.environ.get("DNS_DOMAIN"),
+                        help="Lab DNS domain (default: $DNS_DOMAIN)")
+    parser.add_argument("--output-dir", default=os.path.join(TEST_PATH, "rollout_runs"),
+                        help="Directory for per-wave archives")
+    parser.add_argument("--report", default="rollout_report.json",
+                        help="JSON report file")
+    args, extra_args = parser.parse_known_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if not args.dns_domain:
+        parser.error("--dns-domain or the DNS_DOMAIN environment variable is required")
+
+    sizes = [max(1, int(size)) for size in args.waves.split(",")] if args.waves else ()
+    waves = plan_waves(parse_pods(args.pods, keep_order=True),
+                       canary=max(1, args.canary),
+                       growth=max(1.0, args.growth),
+                       max_wave=max(1, args.max_wave),
+                       sizes=sizes)
+    logger.info("Rollout plan: %d wave(s) of %s pod(s)",
+                len(waves), ", ".join(str(len(wave)) for wave in waves))
+
+    report = run_rollout(waves,
+                         args.configure_datafile,
+                         args.verify_datafile,
+                         max_failures=max(0, args.max_failures),
+                         output_dir=os.path.abspath(args.output_dir),
+                         concurrency=max(1, args.concurrency),
+                         rate=args.rate,
+                         extra_args=extra_args,
+                         job_file=os.path.abspath(args.job),
+                         dns_domain=args.dns_domain)
+
+    with open(args.report, "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, indent=2)
+
+    logger.info("Rollout %s: %d/%d wave(s) in %.1fs, %d pod(s) not started. Report: %s",
+                report["status"],
+                report["waves_run"],
+                report["waves_planned"],
+                report["wall_time"],
+                len(report["pods_not_started"]),
+                args.report)
+
+    return 0 if report["status"] == "completed" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""
+Targeted and batched route lookups for the operational state trigger
+
+Developed for Cisco Live, DevNet Workshop DEVWKS-2539
+
+Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+__author__ = "Palmer Sample"
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import ipaddress
+import logging
+
+from genie.metaparser.util.exceptions import SchemaEmptyParserError
+
+from device_cache import cached_api, cached_parse
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Up to this many expected prefixes are checked with one "show ip route"
+# query each; larger lists fetch the OSPF RIB once and index it.
+DEFAULT_TARGETED_LIMIT = 8
+
+
+class PrefixTrie:
+    """
+    Binary trie of IPv4 prefixes supporting exact and longest-prefix-match
+    lookups in O(prefix length), independent of the number of routes.
+    """
+    def __init__(self, prefixes=()):
+        self._root = {}
+        self._size = 0
+        for prefix in prefixes:
+            self.insert(prefix)
+
+    def __len__(self):
+        return self._size
+
+    @staticmethod
+    def _bits(network):
+        address = int(network.network_address)
+        return [(address >> (31 - bit)) & 1 for bit in range(network.prefixlen)]
+
+    def insert(self, prefix):
+        """
+        Add a prefix to the trie.
+
+        :param prefix: Prefix string, e.g. "172.16.1.254/32"
+        :return: None
+        """
+        network = ipaddress.IPv4Network(prefix, strict=False)
+        node = self._root
+        for bit in self._bits(network):
+            node = node.setdefault(bit, {})
+        if "prefix" not in node:
+            self._size += 1
+        node["prefix"] = str(network)
+
+    def exact(self, prefix):
+        """
+        Return the prefix if present in the trie.
+
+        :param prefix: Prefix string
+        :return: Matching prefix string or None
+        """
+        network = ipaddress.IPv4Network(prefix, strict=False)
+        node = self._root
+        for bit in self._bits(network):
+            node = node.get(bit)
+            if node is None:
+                return None
+        return node.get("prefix")
+
+    def longest_match(self, prefix):
+        """
+        Return the most specific prefix in the trie covering the given
+        prefix or address.
+
+        :param prefix: Prefix or address string
+        :return: Matching prefix string or None
+        """
+        network = ipaddress.IPv4Network(prefix, strict=False)
+        node = self._root
+        match = node.get("prefix")
+        for bit in self._bits(network):
+            node = node.get(bit)
+            if node is None:
+                break
+            match = node.get("prefix", match)
+        return match
+
+
+def targeted_lookup(uut, prefix, longest_match=False, ttl=None):
+    """
+    Query the device for a single prefix. For an exact match the query is
+    "show ip route <address> <netmask>", which only returns the prefix
+    itself. With longest_match it is "show ip route <address>", for which
+    the device returns its most specific route covering the address.
+
+    :param uut: Testbed device object
+    :param prefix: Expected prefix string
+    :param longest_match: Accept any covering OSPF route
+    :param ttl: Optional device cache TTL override (0 always queries the
+        device)
+    :return: Matching OSPF prefix string or None
+    """
+    network = ipaddress.IPv4Network(prefix, strict=False)
+    command = f"show ip route {network.network_address}"
+    try:
+        if longest_match:
+            route_entry = cached_parse(uut, command, ttl=ttl)
+        else:
+            # Same output format; the Genie parser does not model the mask
+            route_entry = cached_parse(uut,
+                                       f"{command} {network.netmask}",
+                                       ttl=ttl,
+                                       parse_as=command)
+    except SchemaEmptyParserError:
+        return None
+
+    for entry_prefix, entry in route_entry.get("entry", {}).items():
+        if not str(entry.get("known_via", "")).startswith("ospf"):
+            continue
+        if longest_match or entry_prefix == str(network):
+            return entry_prefix
+    return None
+
+
+def find_ospf_routes(uut, prefixes, longest_match=False,
+                     targeted_limit=DEFAULT_TARGETED_LIMIT):
+    """
+    Look up a list of expected prefixes in the device OSPF routes.
+
+    Small lists are checked with one targeted route query per prefix. Larger
+    lists fetch the OSPF RIB once, index it in a PrefixTrie, and resolve
+    every prefix from the index.
+
+    :param uut: Testbed device object
+    :param prefixes: Expected prefixes
+    :param longest_match: Accept the most specific covering OSPF route
+        instead of requiring an exact prefix match
+    :param targeted_limit: Maximum list size for targeted queries
+    :return: dict of expected prefix -> matched OSPF prefix (or None)
+    """
+    if len(prefixes) <= targeted_limit:
+        return {prefix: targeted_lookup(uut, prefix, longest_match)
+                for prefix in prefixes}
+
+    rib = PrefixTrie(cached_api(uut, "get_routing_ospf_routes"))
+    logger.info("Indexed %d OSPF routes", len(rib))
+    lookup = rib.longest_match if longest_match else rib.exact
+    return {prefix: lookup(prefix) for prefix in prefixes}
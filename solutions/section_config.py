@@ -0,0 +1,132 @@
+"""
+Section-scoped running-config retrieval
+
+Developed for Cisco Live, DevNet Workshop DEVWKS-2539
+
+Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+__author__ = "Palmer Sample"
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import logging
+import re
+
+from genie.utils.config import Config
+
+from device_cache import cached_execute
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# IOS regular expression metacharacters. re.escape() would also escape
+# spaces, which the IOS "section" filter does not need.
+IOS_REGEX_SPECIAL = re.compile(r"([.*+?()\[\]{}|^$\\])")
+
+
+def ospf_sections(ospf_process_id, tunnel_interface):
+    """
+    Config sections read by the OSPF triggers, derived from the datafile
+    parameters.
+
+    :param ospf_process_id: OSPF process ID (from datafile)
+    :param tunnel_interface: Tunnel interface (from datafile)
+    :return: list of section names
+    """
+    return [f"router ospf {ospf_process_id}",
+            f"interface {tunnel_interface}"]
+
+
+class SectionConfig:
+    """
+    Lazily populated view of the running-config.
+
+    Offers the same .get(section) interface as the object returned by
+    uut.learn("config"), but each section is retrieved on first access with
+    "show running-config | section ^<section>$" and only that output is
+    parsed. The size of the transfer and of the parsed tree depends on the
+    sections under test, not on the size of the device configuration.
+    """
+    def __init__(self, uut, sections=(), ttl=None):
+        """
+        :param uut: Testbed device object
+        :param sections: Sections expected to be read (used by prefetch())
+        :param ttl: Optional device cache TTL override for the section output
+        """
+        self.uut = uut
+        self.sections = list(sections)
+        self.ttl = ttl
+        self._sections = {}
+
+    def __contains__(self, section):
+        return self.get(section) is not None
+
+    def __iter__(self):
+        return iter(section for section, value in self._sections.items()
+                    if value is not None)
+
+    def _fetch(self, section):
+        """
+        Retrieve and parse a single config section from the device.
+
+        :param section: Section header line, e.g. "router ospf 4"
+        :return: dict of the section's children, or None if not configured
+        """
+        pattern = IOS_REGEX_SPECIAL.sub(r"\\\1", section)
+        command = f"show running-config | section ^{pattern}$"
+        output = cached_execute(self.uut, command, ttl=self.ttl)
+        if not output or not output.strip():
+            logger.info("Section '%s' is not configured", section)
+            return None
+
+        config = Config(output)
+        config.tree()
+        return config.config.get(section)
+
+    def get(self, section, default=None):
+        """
+        Return the parsed config section, fetching it on first access.
+
+        :param section: Section header line, e.g. "interface Tunnel1"
+        :param default: Value returned if the section is not configured
+        :return: dict of the section's children, or default
+        """
+        if section not in self._sections:
+            self._sections[section] = self._fetch(section)
+
+        value = self._sections[section]
+        return default if value is None else value
+
+    def seed(self, sections):
+        """
+        Use sections that were already retrieved and parsed, e.g. served
+        from the state store, instead of retrieving them again.
+
+        :param sections: dict of section -> dict of the section's children
+        :return: self
+        """
+        self._sections.update(sections)
+        return self
+
+    def prefetch(self):
+        """
+        Retrieve every section passed to the constructor.
+
+        :return: self
+        """
+        for section in self.sections:
+            self.get(section)
+        return self
@@ -0,0 +1,91 @@
+"""
+Concurrent device queries over a pool of CLI sessions
+
+Developed for Cisco Live, DevNet Workshop DEVWKS-2539
+
+Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+A single CLI session runs one command at a time. pyATS can open a pool of
+sessions under one connection alias (uut.connect(pool_size=N)), whose
+execute() hands each call to a free session. collect_concurrently() runs
+independent queries - the usual cached helpers - in threads over such a
+pool, so their results are in the device cache before the tests read
+them, and the collection takes as long as the slowest query.
+"""
+
+__author__ = "Palmer Sample"
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import current_section, instrument, use_session
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+POOL_ALIAS = "session_pool"
+
+
+def open_session_pool(uut, sessions, alias=POOL_ALIAS):
+    """
+    Open (or reuse) a pool of CLI sessions to the device.
+
+    :param uut: Testbed device object
+    :param sessions: Number of sessions in the pool
+    :param alias: Connection alias of the pool
+    :return: Connection pool
+    """
+    if not uut.is_connected(alias=alias):
+        logger.info("Opening %d CLI sessions to %s", sessions, uut.name)
+        uut.connect(alias=alias, via="cli", pool_size=sessions, log_stdout=False)
+    return getattr(uut, alias)
+
+
+def close_session_pool(uut, alias=POOL_ALIAS):
+    """
+    Close the pool opened by open_session_pool(), if any.
+
+    :param uut: Testbed device object
+    :param alias: Connection alias of the pool
+    :return: None
+    """
+    if uut.is_connected(alias=alias):
+        uut.disconnect(alias=alias)
+
+
+def collect_concurrently(uut, pool, queries):
+    """
+    Run every query at the same time, each in its own thread with the
+    device's execute() routed through the pool.
+
+    :param uut: Testbed device object
+    :param pool: Connection pool from open_session_pool()
+    :param queries: dict of query name -> callable
+    :return: dict of query name -> exception, for the queries that failed
+    """
+    instrument(uut)
+    section = current_section()
+
+    def run(query):
+        with use_session(uut, pool, section):
+            return query()
+
+    with ThreadPoolExecutor(max_workers=len(queries)) as executor:
+        futures = {name: executor.submit(run, query) for name, query in queries.items()}
+
+    return {name: future.exception() for name, future in futures.items()
+            if future.exception() is not None}
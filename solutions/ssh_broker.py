@@ -0,0 +1,181 @@
+"""
+Persistent SSH session broker for the workshop testbed
+
+Developed for Cisco Live, DevNet Workshop DEVWKS-2539
+
+Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+When SSH_MULTIPLEX=1 is set, prepare_lab.sh enables OpenSSH connection
+multiplexing (ControlMaster/ControlPath/ControlPersist) in the SSH
+configuration it generates. Multiplexing is off by default, as it has not
+been checked against the lab routers' SSH server yet:
+
+    export SSH_MULTIPLEX=1
+    source prepare_lab.sh
+
+The first connection to a device becomes a background master process that
+holds the proxied, authenticated transport; every later connection made by
+the "connect" subsection attaches to it instead of going through the proxy
+and authentication again. A master that has no attached sessions for the
+ControlPersist period (default 30m) exits on its own.
+
+This script manages those masters for the devices in a testbed:
+
+    python ssh_broker.py warm      # log in once, leave the masters running
+    python ssh_broker.py status    # health check every master
+    python ssh_broker.py stop      # close every master
+"""
+
+__author__ = "Palmer Sample"
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import argparse
+import logging
+import os
+import shlex
+import subprocess
+import sys
+
+from pyats.topology.loader import load
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+TEST_PATH = os.path.dirname(os.path.abspath(__file__))
+
+
+def ssh_username(device):
+    """
+    Username unicon logs in with: the connection's default credentials,
+    then the device's, then the testbed's.
+
+    :param device: pyATS device object
+    :return: Username, or None if no default credentials are set
+    """
+    for credentials in (device.connections.cli.get("credentials"),
+                        getattr(device, "credentials", None),
+                        getattr(device.testbed, "credentials", None)):
+        default = (credentials or {}).get("default") or {}
+        if default.get("username"):
+            return str(default["username"])
+    return None
+
+
+def ssh_command(device, *control_args):
+    """
+    Build an ssh control command for the device's CLI connection, using the
+    same ssh_options and login user the testbed passes to unicon. The user
+    is part of the ControlPath hash (%C), so it must match the master's.
+
+    :param device: pyATS device object
+    :param control_args: ssh arguments, e.g. ("-O", "check")
+    :return: list of command arguments
+    """
+    connection = device.connections.cli
+    command = ["ssh", *shlex.split(str(connection.get("ssh_options", "")))]
+    username = ssh_username(device)
+    if username:
+        command += ["-l", username]
+    if connection.get("port"):
+        command += ["-p", str(connection.port)]
+    command += [*control_args, str(connection.host)]
+    return command
+
+
+def is_alive(device):
+    """
+    Health check the multiplexing master for a device.
+
+    :param device: pyATS device object
+    :return: True if a master is running and responsive
+    """
+    result = subprocess.run(ssh_command(device, "-O", "check"),
+                            capture_output=True,
+                            text=True,
+                            check=False)
+    return result.returncode == 0
+
+
+def warm(device):
+    """
+    Open a master for the device by logging in once through unicon. The
+    master stays in the background after the session is closed.
+
+    :param device: pyATS device object
+    :return: True if the master is running
+    """
+    if is_alive(device):
+        logger.info("%-30s already warm", device.name)
+        return True
+
+    device.connect(via="cli", log_stdout=False, learn_hostname=True)
+    device.disconnect()
+
+    alive = is_alive(device)
+    logger.info("%-30s %s", device.name, "warm" if alive else "FAILED")
+    if not alive:
+        logger.info("Is SSH multiplexing enabled? Set SSH_MULTIPLEX=1 and re-run prepare_lab.sh")
+    return alive
+
+
+def stop(device):
+    """
+    Close the master for a device, dropping its warm session.
+
+    :param device: pyATS device object
+    :return: None
+    """
+    subprocess.run(ssh_command(device, "-O", "exit"),
+                   capture_output=True,
+                   check=False)
+    logger.info("%-30s stopped", device.name)
+
+
+def main():
+    """
+    Command line entry point
+
+    :return: Process exit code
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("action", choices=("warm", "status", "stop"))
+    parser.add_argument("--testbed-file", default=os.path.join(TEST_PATH, "testbed.yml"))
+    parser.add_argument("--devices", nargs="*",
+                        help="Device names (default: every device in the testbed)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    testbed = load(args.testbed_file)
+    devices = [testbed.devices[name] for name in args.devices or testbed.devices]
+
+    unhealthy = 0
+    for device in devices:
+        if args.action == "warm":
+            unhealthy += not warm(device)
+        elif args.action == "stop":
+            stop(device)
+        elif is_alive(device):
+            logger.info("%-30s alive", device.name)
+        else:
+            logger.info("%-30s not running", device.name)
+            unhealthy += 1
+
+    return 1 if unhealthy else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
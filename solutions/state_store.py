@@ -0,0 +1,347 @@
+"""
+Compact memory-mapped store of learned device state
+
+Developed for Cisco Live, DevNet Workshop DEVWKS-2539
+
+Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+Each device's learned config sections and parsed results are written once,
+by the worker that tested it, to one file in the store directory.
+TestOspfConfigState serves the stored sections back on the next run while
+the device's "Last configuration change" stamp is unchanged. The OSPF
+facts TestOspfOpState records are read by fleet_analysis.py.
+
+Nested dicts are flattened into (path, value) records sorted by path:
+
+    header   b"DSTS", version, record count           (struct "<4sII")
+    index    key offset/length, value offset/length   (struct "<IIII" each)
+    keys     path components joined with NUL, UTF-8
+    values   JSON-encoded leaf values
+
+Readers mmap the file and binary-search the index through a memoryview.
+Looking up one value, or one subtree such as a config section, touches
+only the pages it needs and decodes only the matching records. The files
+live in the page cache, shared by every reader process, so memory stays
+flat no matter how many devices are read.
+
+    python state_store.py <directory>                   # list devices
+    python state_store.py <directory> --device <device> --path ospf router_id
+"""
+
+__author__ = "Palmer Sample"
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import argparse
+import glob
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+MAGIC = b"DSTS"
+VERSION = 1
+HEADER = struct.Struct("<4sII")
+ENTRY = struct.Struct("<IIII")
+SEPARATOR = "\0"
+SUFFIX = ".state"
+
+
+def encode_path(path):
+    """
+    :param path: tuple of path components
+    :return: bytes
+    """
+    return SEPARATOR.join(str(component) for component in path).encode("utf-8")
+
+
+def flatten(data, path=()):
+    """
+    Flatten nested dicts into (path, value) records. Non-dict values and
+    empty dicts are leaves.
+
+    :param data: dict to flatten
+    :param path: Path of data itself
+    :return: generator of (tuple, value)
+    """
+    if isinstance(data, dict) and data:
+        for key, value in data.items():
+            yield from flatten(value, (*path, key))
+    else:
+        yield path, data
+
+
+def unflatten(records, depth):
+    """
+    Rebuild a nested dict from (path, value) records.
+
+    :param records: iterable of (tuple, value)
+    :param depth: Number of leading path components to drop
+    :return: dict
+    """
+    tree = {}
+    for path, value in records:
+        node = tree
+        for component in path[depth:-1]:
+            node = node.setdefault(component, {})
+        if len(path) > depth:
+            node[path[-1]] = value
+    return tree
+
+
+class StateWriter:
+    """
+    Collects a device's records and writes them as one store file. Records
+    already in the file are kept unless replaced, so several triggers can
+    add to the same device's file.
+    """
+    def __init__(self, path):
+        """
+        :param path: Store file to update
+        """
+        self.path = path
+        self._records = {}
+        if os.path.exists(path):
+            with StateReader(path) as reader:
+                self._records.update(reader.raw_records())
+
+    def add(self, path, data):
+        """
+        Add a dict (or a single value) under a path, e.g.
+        add(("config", "router ospf 4"), section_tree). Anything previously
+        stored under the path is replaced.
+
+        :param path: tuple of path components
+        :param data: JSON-serializable data
+        :return: self
+        """
+        key = encode_path(path)
+        prefix = key + SEPARATOR.encode()
+        for stale in [stale for stale in self._records
+                      if stale == key or stale.startswith(prefix)]:
+            del self._records[stale]
+
+        for leaf_path, value in flatten(data, tuple(path)):
+            self._records[encode_path(leaf_path)] = json.dumps(value, default=str).encode("utf-8")
+        return self
+
+    def write(self):
+        """
+        Write the store file atomically.
+
+        :return: Path of the file
+        """
+        keys = sorted(self._records)
+        index_size = HEADER.size + ENTRY.size * len(keys)
+        keys_size = sum(len(key) for key in keys)
+
+        index = bytearray(HEADER.pack(MAGIC, VERSION, len(keys)))
+        key_offset = index_size
+        value_offset = index_size + keys_size
+        for key in keys:
+            value = self._records[key]
+            index += ENTRY.pack(key_offset, len(key), value_offset, len(value))
+            key_offset += len(key)
+            value_offset += len(value)
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        handle, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(handle, "wb") as store_file:
+            store_file.write(index)
+            for key in keys:
+                store_file.write(key)
+            for key in keys:
+                store_file.write(self._records[key])
+        os.replace(temp_path, self.path)
+        return self.path
+
+
+class StateReader:
+    """
+    Read-only, memory-mapped view of one device's store file.
+    """
+    def __init__(self, path):
+        """
+        :param path: Store file
+        """
+        with open(path, "rb") as store_file:
+            self._mmap = mmap.mmap(store_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        magic, version, self._count = HEADER.unpack_from(self._view, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} state store file")
+
+    def __len__(self):
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Release the mapping.
+
+        :return: None
+        """
+        self._view.release()
+        self._mmap.close()
+
+    def _entry(self, position):
+        return ENTRY.unpack_from(self._view, HEADER.size + position * ENTRY.size)
+
+    def _key(self, position):
+        key_offset, key_length, _, _ = self._entry(position)
+        return self._view[key_offset:key_offset + key_length]
+
+    def _value(self, position):
+        _, _, value_offset, value_length = self._entry(position)
+        return json.loads(self._view[value_offset:value_offset + value_length].tobytes())
+
+    def _lower_bound(self, key):
+        """
+        Position of the first record whose key is >= key.
+        """
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle).tobytes() < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def get(self, path, default=None):
+        """
+        Return the leaf value, or the rebuilt subtree, stored under a path.
+        The empty path returns every record, {} for an empty file.
+
+        :param path: tuple of path components
+        :param default: Returned if nothing is stored under the path
+        :return: Value, dict, or default
+        """
+        if not path and not self._count:
+            return {}
+        key = encode_path(path)
+        position = self._lower_bound(key)
+        if position < self._count and self._key(position) == key:
+            return self._value(position)
+
+        prefix = key + SEPARATOR.encode() if path else b""
+        records = list(self._scan(prefix, position))
+        if not records:
+            return default
+        return unflatten(records, len(path))
+
+    def raw_records(self):
+        """
+        Yield every record as (key, value) bytes, without decoding.
+
+        :return: generator of (bytes, bytes)
+        """
+        for position in range(self._count):
+            _, _, value_offset, value_length = self._entry(position)
+            yield (self._key(position).tobytes(),
+                   self._view[value_offset:value_offset + value_length].tobytes())
+
+    def _scan(self, prefix, position=0):
+        """
+        Yield (path, value) for every record whose key starts with prefix.
+        """
+        position = max(position, self._lower_bound(prefix))
+        while position < self._count:
+            key = self._key(position).tobytes()
+            if not key.startswith(prefix):
+                return
+            yield tuple(key.decode("utf-8").split(SEPARATOR)), self._value(position)
+            position += 1
+
+
+class StateStore:
+    """
+    Directory of per-device store files.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, device):
+        """
+        :param device: Device key, e.g. from verdict_store.device_key()
+        :return: Store file path for the device
+        """
+        return os.path.join(self.directory, re.sub(r"[^\w.@-]", "_", device) + SUFFIX)
+
+    def writer(self, device):
+        """
+        :param device: Device key
+        :return: StateWriter for the device
+        """
+        return StateWriter(self.path(device))
+
+    def reader(self, device):
+        """
+        :param device: Device key
+        :return: StateReader for the device
+        """
+        return StateReader(self.path(device))
+
+    def devices(self):
+        """
+        :return: Sorted list of the store file names (without suffix)
+        """
+        return sorted(os.path.basename(path)[:-len(SUFFIX)]
+                      for path in glob.glob(os.path.join(self.directory, f"*{SUFFIX}")))
+
+
+def main():
+    """
+    Command line entry point
+
+    :return: Process exit code
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("directory", help="State store directory")
+    parser.add_argument("--device", help="Device to read")
+    parser.add_argument("--path", nargs="*", default=[],
+                        help="Path to read, e.g. ospf router_id")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    store = StateStore(args.directory)
+    if not args.device:
+        for device in store.devices():
+            logger.info(device)
+        return 0
+
+    with store.reader(args.device) as reader:
+        json.dump(reader.get(tuple(args.path)), sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
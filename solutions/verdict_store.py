@@ -0,0 +1,118 @@
+"""
+On-disk store of per-device verdicts for incremental config-state runs
+
+Developed for Cisco Live, DevNet Workshop DEVWKS-2539
+
+Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+__author__ = "Palmer Sample"
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+
+from device_cache import cached_execute
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+LAST_CHANGE_COMMAND = "show running-config | include ^! Last configuration change"
+
+
+def digest(data):
+    """
+    Stable content hash of JSON-serializable data.
+
+    :param data: Data to hash
+    :return: Hex digest
+    """
+    encoded = json.dumps(data, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def device_key(uut):
+    """
+    Identify a device across runs. The fleet runner reuses the same device
+    name for every pod, so the CLI host is part of the key.
+
+    :param uut: Testbed device object
+    :return: str
+    """
+    try:
+        host = uut.connections.cli.host
+    except (AttributeError, KeyError):
+        host = ""
+    return f"{uut.name}@{host}" if host else str(uut.name)
+
+
+def last_config_change(uut):
+    """
+    Return the "Last configuration change" stamp from the running-config
+    header. Only this one line crosses the wire.
+
+    :param uut: Testbed device object
+    :return: str, or None if the device did not report one
+    """
+    output = cached_execute(uut, LAST_CHANGE_COMMAND) or ""
+    match = re.search(r"Last configuration change at (.+)", output)
+    return match.group(1).strip() if match else None
+
+
+class VerdictStore:
+    """
+    One JSON file per device in a directory, so parallel fleet workers
+    never write to the same file.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.directory, f"{name}.json")
+
+    def get(self, key):
+        """
+        Load the stored record for a device.
+
+        :param key: Device key (see device_key())
+        :return: dict, or None if the device has no stored record
+        """
+        try:
+            with open(self._path(key), encoding="utf-8") as record_file:
+                record = json.load(record_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return record if record.get("device") == key else None
+
+    def put(self, key, record):
+        """
+        Atomically store the record for a device.
+
+        :param key: Device key (see device_key())
+        :param record: JSON-serializable dict
+        :return: None
+        """
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(handle, "w", encoding="utf-8") as record_file:
+            json.dump({**record, "device": key}, record_file, indent=2)
+        os.replace(temp_path, self._path(key))
+        logger.info("Stored verdict '%s' for %s", record.get("result"), key)
@@ -0,0 +1,297 @@
+"""
+Pre-forked worker service that runs Easypy jobs without the import cost
+
+Developed for Cisco Live, DevNet Workshop DEVWKS-2539
+
+Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"pyats run job" spends seconds importing pyATS, Genie, unicon and the
+parser libraries before the first device is contacted. The service
+imports all of that once, together with the trigger modules in code/ and
+solutions/, then keeps a pool of forked workers waiting on a Unix socket.
+Each worker runs exactly one job with a private copy of the warm
+interpreter and exits; the service forks a replacement.
+
+    # Start the service (foreground)
+    python warm_worker.py serve --workers 4
+
+    # Submit a job: output is streamed back, exit code is the job's
+    python warm_worker.py run job.py --trigger-datafile spoke_trigger_data.yml
+
+The job runs with the submitting shell's working directory and
+environment, so POD_NUMBER, RTR_DNS_NAME etc. apply as usual. Restart the
+service after changing the trigger code.
+"""
+
+__author__ = "Palmer Sample"
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import argparse
+import glob
+import importlib
+import json
+import logging
+import os
+import runpy
+import signal
+import socket
+import sys
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+TEST_PATH = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_SOCKET = os.environ.get("PYATS_WORKER_SOCKET", "/tmp/devwks-pyats-worker.sock")
+
+# Imported once by the service; failures are logged and ignored
+PRELOAD_MODULES = (
+    "pyats.aetest",
+    "pyats.easypy",
+    "pyats.topology",
+    "genie.harness.main",
+    "genie.harness.base",
+    "genie.conf.base",
+    "genie.utils.config",
+    "genie.libs.parser.iosxe.show_ospf",
+    "genie.libs.parser.iosxe.show_routing",
+    "genie.libs.sdk.apis.iosxe.ospf.get",
+    "unicon",
+    "unicon.plugins.iosxe",
+)
+
+# Sent after the job output; NUL never appears in the CLI output itself
+EXIT_MARKER = b"\0EXIT "
+
+# Trigger modules of each preloaded directory, by module name
+PRELOADED = {}
+
+
+def preload(directories):
+    """
+    Import the framework modules, then every module in each directory.
+    The code/ and solutions/ trigger modules share names, so each
+    directory's modules are kept aside and only installed in sys.modules
+    by the worker running a job from that directory.
+
+    :param directories: Directories containing trigger modules
+    :return: None
+    """
+    for module_name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(module_name)
+        except ImportError as err:
+            logger.warning("Could not preload %s: %s", module_name, err)
+
+    own_name = os.path.splitext(os.path.basename(__file__))[0]
+    for directory in directories:
+        directory = os.path.abspath(directory)
+        local_names = {os.path.splitext(os.path.basename(path))[0]
+                       for path in glob.glob(os.path.join(directory, "*.py"))}
+        local_names.discard(own_name)
+
+        sys.path.insert(0, directory)
+        try:
+            for module_name in sorted(local_names):
+                try:
+                    importlib.import_module(module_name)
+                except Exception as err:  # pylint: disable=broad-except
+                    logger.warning("Could not preload %s from %s: %s",
+                                   module_name, directory, err)
+        finally:
+            sys.path.remove(directory)
+
+        PRELOADED[directory] = {module_name: sys.modules.pop(module_name)
+                                for module_name in local_names
+                                if module_name in sys.modules}
+        logger.info("Preloaded %d module(s) from %s",
+                    len(PRELOADED[directory]), directory)
+
+
+def run_job(request):
+    """
+    Run an Easypy job in the current (worker) process, as
+    "python -m pyats.easypy <job> <args>" would.
+
+    :param request: dict with "job", "args", "cwd" and "env"
+    :return: Job exit code
+    """
+    job_directory = os.path.dirname(request["job"])
+    sys.path.insert(0, job_directory)
+    sys.modules.update(PRELOADED.get(job_directory, {}))
+
+    os.chdir(request["cwd"])
+    os.environ.clear()
+    os.environ.update(request["env"])
+    sys.argv = ["easypy", request["job"], *request["args"]]
+
+    try:
+        runpy.run_module("pyats.easypy", run_name="__main__", alter_sys=True)
+    except SystemExit as exit_signal:
+        code = exit_signal.code
+        return code if isinstance(code, int) else (0 if code is None else 1)
+    return 0
+
+
+def worker(listener):
+    """
+    Worker process: accept one job, stream its output back over the
+    connection, report the exit code and exit.
+
+    :param listener: Listening Unix socket inherited from the service
+    :return: Does not return
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    connection, _ = listener.accept()
+    listener.close()
+    returncode = 1
+    try:
+        with connection.makefile("rb") as request_file:
+            request = json.loads(request_file.readline())
+
+        # Job output (and the Easypy log) goes straight to the client
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(connection.fileno(), 1)
+        os.dup2(connection.fileno(), 2)
+        logging.getLogger().handlers.clear()
+
+        returncode = run_job(request)
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Job failed to run")
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        connection.sendall(EXIT_MARKER + f"{returncode}\n".encode())
+        connection.close()
+        os._exit(0)  # pylint: disable=protected-access
+
+
+def serve(socket_path, workers, directories):
+    """
+    Preload the modules and keep "workers" forked workers waiting for jobs
+    until interrupted.
+
+    :param socket_path: Unix socket path
+    :param workers: Number of idle workers to keep
+    :param directories: Directories containing trigger modules
+    :return: Process exit code
+    """
+    preload(directories)
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(workers * 4)
+    logger.info("Listening on %s with %d worker(s)", socket_path, workers)
+
+    # Convert SIGTERM into the same clean shutdown as Ctrl-C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    children = set()
+    try:
+        while True:
+            while len(children) < workers:
+                pid = os.fork()
+                if pid == 0:
+                    worker(listener)
+                children.add(pid)
+            pid, _ = os.wait()
+            children.discard(pid)
+    except KeyboardInterrupt:
+        logger.info("Shutting down")
+    finally:
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+        listener.close()
+        os.unlink(socket_path)
+    return 0
+
+
+def submit(socket_path, job_file, job_args):
+    """
+    Submit a job to the service and stream its output to stdout.
+
+    :param socket_path: Unix socket path
+    :param job_file: Path to the Easypy job file
+    :param job_args: Additional Easypy/job arguments
+    :return: Job exit code
+    """
+    request = {"job": os.path.abspath(job_file),
+               "args": list(job_args),
+               "cwd": os.getcwd(),
+               "env": dict(os.environ)}
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        connection.sendall(json.dumps(request).encode() + b"\n")
+
+        output = sys.stdout.buffer
+        tail = b""
+        while chunk := connection.recv(65536):
+            data = tail + chunk
+            # Hold back enough bytes to never split the exit marker
+            marker = data.find(EXIT_MARKER)
+            if marker >= 0:
+                output.write(data[:marker])
+                tail = data[marker:]
+                continue
+            output.write(data[:-len(EXIT_MARKER)])
+            tail = data[-len(EXIT_MARKER):]
+        output.flush()
+
+    if not tail.startswith(EXIT_MARKER):
+        logger.error("Worker exited without reporting a result")
+        return 1
+    return int(tail[len(EXIT_MARKER):].strip() or 1)
+
+
+def main():
+    """
+    Command line entry point
+
+    :return: Process exit code
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--socket", default=DEFAULT_SOCKET,
+                        help="Unix socket path (default: $PYATS_WORKER_SOCKET "
+                             "or /tmp/devwks-pyats-worker.sock)")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="Run the worker service")
+    serve_parser.add_argument("--workers", type=int, default=2,
+                              help="Idle workers kept ready")
+    serve_parser.add_argument("--directories", nargs="+",
+                              default=[TEST_PATH, os.path.join(TEST_PATH, "..", "code")],
+                              help="Trigger module directories to preload")
+
+    run_parser = subparsers.add_parser("run", help="Submit a job")
+    run_parser.add_argument("job", help="Easypy job file")
+
+    args, job_args = parser.parse_known_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.action == "serve":
+        return serve(args.socket, max(1, args.workers), args.directories)
+    return submit(args.socket, args.job, job_args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())